@@ -0,0 +1,32 @@
+"""
+Helpers shared by the benchmarks.
+"""
+import os
+import time
+
+
+def setup_django(settings_module='project.settings'):
+    """
+    Configures django and creates a throwaway test database to benchmark on
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def timed(func, repeat=5):
+    """
+    Returns the best wall time of func over repeat runs, in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,63 @@
+"""
+Benchmark of parallel_load with a growing number of worker processes.
+
+Writes a CSV file of movies, then loads it with 1, 2, 4... workers up to the
+number of cores and reports the rows loaded per second. Run from the
+repository root:
+
+    python -m benchmarks.parallel_load --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+from io import StringIO
+
+from benchmarks.common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.management import call_command
+    from schemas.models import Table
+
+    template = Table.objects.create_table_with_attributes('movies', [
+        {'name': 'title', 'attr_type': 'str', 'required': True},
+        {'name': 'rating', 'attr_type': 'float'},
+        {'name': 'votes', 'attr_type': 'int'},
+        {'name': 'seen', 'attr_type': 'bool'},
+        {'name': 'release_date', 'attr_type': 'datetime'},
+    ])
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(handle, 'w') as stream:
+        stream.write('title,rating,votes,seen,release_date\n')
+        for row in range(args.rows):
+            stream.write(
+                f'Movie {row},{row % 100 / 10},{row},{row % 2 == 0},'
+                f'{row % 28 + 1}/07/2010\n'
+            )
+
+    workers = 1
+    print(f'{args.rows} rows')
+    print(f"{'workers':<10}{'time':>10}{'rows/s':>12}")
+    while workers <= args.max_workers:
+        Table.objects.exclude(pk=template.pk).delete()
+        started = time.perf_counter()
+        call_command(
+            'parallel_load', template.pk, path, workers=workers,
+            stdout=StringIO()
+        )
+        elapsed = time.perf_counter() - started
+        print(f'{workers:<10}{elapsed:>8.2f} s{args.rows / elapsed:>12.0f}')
+        workers *= 2
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of the per-row cost of rendering table payloads.
+
+Compares serializing every attribute through AttributeSerializer (the
+previous TableSerializer implementation) with the values_list based
+renderer in schemas.rows. Run from the repository root:
+
+    python -m benchmarks.render_rows --rows 100 --columns 20
+"""
+import argparse
+
+from benchmarks.common import setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.renderers import JSONRenderer
+    from schemas.models import Table, Attribute
+    from schemas.serializers import AttributeSerializer, TableSerializer
+
+    attr_types = ('str', 'int', 'float', 'bool', 'datetime')
+    samples = {
+        'str': 'Inception',
+        'int': '148',
+        'float': '8.8',
+        'bool': 'True',
+        'datetime': '16/07/2010',
+    }
+    for row in range(args.rows):
+        table = Table.objects.create(name='movies')
+        Attribute.objects.bulk_create(
+            Attribute(
+                table=table,
+                name=f'column_{column}',
+                attr_type=attr_types[column % len(attr_types)],
+                attr_value=samples[attr_types[column % len(attr_types)]],
+            )
+            for column in range(args.columns)
+        )
+    tables = list(Table.objects.all())
+    renderer = JSONRenderer()
+
+    def attribute_serializer():
+        data = []
+        for table in tables:
+            row = {
+                attr['name']: attr['value'] for attr in (
+                    AttributeSerializer(attr).data
+                    for attr in table.table_attrs.all()
+                )
+            }
+            row['name'] = table.name
+            data.append(row)
+        return renderer.render(data)
+
+    def row_renderer():
+        return renderer.render(TableSerializer(tables, many=True).data)
+
+    assert attribute_serializer() == row_renderer()
+
+    print(f'{args.rows} rows x {args.columns} columns')
+    for label, func in (
+        ('AttributeSerializer', attribute_serializer),
+        ('schemas.rows', row_renderer),
+    ):
+        elapsed = timed(func, args.repeat)
+        print(
+            f'{label:<22}{elapsed * 1000:>10.2f} ms'
+            f'{elapsed * 1e6 / args.rows:>12.1f} us/row'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark of table snapshots against dumpdata/loaddata.
+
+Fills a throwaway database, then reports dump time, restore time and file
+size for snapshot_tables/restore_tables and for a JSON dumpdata/loaddata of
+Table and Attribute. Run from the repository root:
+
+    python -m benchmarks.snapshot --tables 2000 --columns 10
+"""
+import argparse
+import os
+import tempfile
+import time
+from io import StringIO
+
+from benchmarks.common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tables', type=int, default=2000)
+    parser.add_argument('--columns', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.management import call_command
+    from django.db import transaction
+    from schemas.models import Table, Attribute, ShardMap
+
+    attr_types = ('str', 'int', 'float', 'bool', 'datetime')
+    samples = {
+        'str': lambda row: f'Movie {row}',
+        'int': str,
+        'float': lambda row: str(row / 10),
+        'bool': lambda row: str(row % 2 == 0),
+        'datetime': lambda row: f'{row % 28 + 1}/07/2010',
+    }
+    with transaction.atomic():
+        entries = ShardMap.objects.allocate(args.tables)
+        Table.objects.bulk_create(
+            Table(id=entry.table_id, name='movies') for entry in entries
+        )
+        Attribute.objects.bulk_create(
+            Attribute(
+                table_id=entry.table_id,
+                name=f'column_{column}',
+                attr_type=attr_types[column % len(attr_types)],
+                attr_value=samples[attr_types[column % len(attr_types)]](
+                    entry.table_id
+                ),
+            )
+            for entry in entries
+            for column in range(args.columns)
+        )
+
+    def clear():
+        Table.objects.all().delete()
+        ShardMap.objects.all().delete()
+
+    workdir = tempfile.mkdtemp()
+    fixture = os.path.join(workdir, 'tables.json')
+    snapshot = os.path.join(workdir, 'tables.snapshot')
+
+    def run(label, dump, restore, path):
+        started = time.perf_counter()
+        dump()
+        dumped = time.perf_counter() - started
+        clear()
+        started = time.perf_counter()
+        restore()
+        restored = time.perf_counter() - started
+        print(
+            f'{label:<22}{dumped:>10.2f} s{restored:>12.2f} s'
+            f'{os.path.getsize(path) / 1024:>12.0f} KB'
+        )
+
+    print(f'{args.tables} tables x {args.columns} columns')
+    print(f"{'':<22}{'dump':>12}{'restore':>14}{'size':>15}")
+    run(
+        'dumpdata/loaddata',
+        lambda: call_command(
+            'dumpdata', 'schemas.Table', 'schemas.Attribute',
+            'schemas.ShardMap', output=fixture, stdout=StringIO()
+        ),
+        lambda: call_command('loaddata', fixture, stdout=StringIO()),
+        fixture,
+    )
+    run(
+        'snapshot/restore',
+        lambda: call_command('snapshot_tables', snapshot, stdout=StringIO()),
+        lambda: call_command('restore_tables', snapshot, stdout=StringIO()),
+        snapshot,
+    )
+
+
+if __name__ == '__main__':
+    main()
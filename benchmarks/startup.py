@@ -0,0 +1,93 @@
+"""
+Worker startup benchmark.
+
+Boots a fresh interpreter per run for every settings profile, loads the WSGI
+application and the URLconf the way a worker does before serving its first
+request, and reports import time and resident memory. Run from the
+repository root:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 project.settings_api
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PROFILES = (
+    'project.settings',
+    'project.settings_api',
+)
+
+WORKER_BOOT = """
+import json, os, resource, sys, time
+os.environ['DJANGO_SETTINGS_MODULE'] = sys.argv[1]
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().resolve('/api/table/')
+elapsed = time.perf_counter() - started
+rss_kb = None
+try:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'import_ms': elapsed * 1000,
+    'rss_kb': rss_kb,
+    'modules': len(sys.modules),
+}))
+"""
+
+
+def boot_worker(profile):
+    """
+    Boots one worker interpreter and returns its measurements
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER_BOOT, profile],
+        cwd=BASE_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(profile, runs):
+    samples = [boot_worker(profile) for _ in range(runs)]
+    return {
+        'profile': profile,
+        'import_ms': statistics.median(s['import_ms'] for s in samples),
+        'rss_mb': statistics.median(s['rss_kb'] for s in samples) / 1024,
+        'modules': statistics.median(s['modules'] for s in samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('profiles', nargs='*', default=PROFILES)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'profile':<24}{'import (ms)':>14}{'rss (MB)':>12}{'modules':>10}")
+    for profile in args.profiles:
+        result = measure(profile, args.runs)
+        print(
+            f"{result['profile']:<24}"
+            f"{result['import_ms']:>14.1f}"
+            f"{result['rss_mb']:>12.1f}"
+            f"{result['modules']:>10.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
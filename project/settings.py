@@ -56,6 +56,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'schemas.db_routers.ReplicaStickinessMiddleware',
+    'schemas.slow_queries.SlowQueryLogMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
@@ -86,9 +88,30 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Local stand-in for a read replica, enable it in DATABASE_REPLICAS
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+    },
+    # Local stand-in for a second shard, enable it in SCHEMAS_SHARDS
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.shard1.sqlite3',
+    },
 }
 
+DATABASE_ROUTERS = ['schemas.db_routers.ReplicaRouter']
+
+# Aliases reads are balanced across, reads use 'default' while it's empty
+DATABASE_REPLICAS = []
+
+# Seconds a client keeps reading from 'default' after a write
+REPLICA_STICKY_SECONDS = 5
+
+# Aliases simulated tables are spread across, see schemas.sharding
+SCHEMAS_SHARDS = ['default']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -0,0 +1,42 @@
+"""
+Slim settings profile for workers that only serve the schema API.
+
+Drops the admin, sessions, messages, allauth, rest_auth and
+django_extensions apps (and their middleware) so every worker boots faster
+and keeps a smaller resident set. Use it with:
+
+    DJANGO_SETTINGS_MODULE=project.settings_api gunicorn project.wsgi
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'schemas',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'schemas.db_routers.ReplicaStickinessMiddleware',
+    'schemas.slow_queries.SlowQueryLogMiddleware',
+]
+
+ROOT_URLCONF = 'project.urls_api'
+
+# No template-based responses are rendered by the API-only profile.
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': [],
+    # Avoids importing django.contrib.auth just to build AnonymousUser.
+    'UNAUTHENTICATED_USER': None,
+}
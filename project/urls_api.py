@@ -0,0 +1,9 @@
+"""project URL Configuration for the API-only profile
+
+Only exposes the schema API, see project.settings_api.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('api/', include('schemas.urls')),
+]
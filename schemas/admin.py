@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import Table, Attribute
+from .models import Table, Attribute, ColumnStatistics, SlowQuery
 
 admin.site.register(Table)
 admin.site.register(Attribute)
+admin.site.register(ColumnStatistics)
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('duration_ms', 'action', 'database', 'sql', 'created_at')
+    list_filter = ('action', 'database')
+    search_fields = ('fingerprint', 'sql')
+    ordering = ('-duration_ms', )
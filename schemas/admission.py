@@ -0,0 +1,242 @@
+"""
+Admission control for the schema API.
+
+Every request holds a slot of its endpoint class (scan, lookup, write or
+changes) and, for detail routes, a slot of the table it targets. Each slot
+allows a fixed number of concurrent requests plus a bounded queue of waiting
+ones; requests that find the queue full, or wait longer than the timeout,
+are shed with a Retry-After header instead of piling up behind expensive
+calls.
+
+Limits are per worker process and configured with SCHEMAS_ADMISSION.
+"""
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import Throttled
+
+DEFAULTS = {
+    'ENDPOINTS': {
+        'scan': {'CONCURRENCY': 4, 'QUEUE': 16, 'TIMEOUT': 5.0},
+        'lookup': {'CONCURRENCY': 32, 'QUEUE': 64, 'TIMEOUT': 1.0},
+        'write': {'CONCURRENCY': 8, 'QUEUE': 32, 'TIMEOUT': 5.0},
+        # Change feed long-polls hold their worker thread until they time
+        # out, extra ones are shed instead of queued
+        'changes': {'CONCURRENCY': 16, 'QUEUE': 0, 'TIMEOUT': 0},
+    },
+    'TABLE': {'CONCURRENCY': 8, 'QUEUE': 16, 'TIMEOUT': 1.0},
+    'RETRY_AFTER': 1,
+}
+
+# Endpoint class of every TableViewSet action, unknown actions are writes.
+ACTION_ENDPOINTS = {
+    'list': 'scan',
+    'retrieve': 'lookup',
+    'get_schema': 'lookup',
+    'metadata': 'lookup',
+}
+
+
+class Overloaded(Throttled):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Service overloaded.'
+    default_code = 'overloaded'
+
+
+class Slot:
+    """
+    Counting semaphore with a bounded wait queue and shed accounting
+    """
+
+    def __init__(self, concurrency, queue, timeout):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.users = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            if self.in_flight < self.concurrency and not self.queued:
+                return self._admit()
+            if self.queued >= self.queue:
+                self.shed += 1
+                return False
+
+            self.queued += 1
+            try:
+                has_room = self.condition.wait_for(
+                    lambda: self.in_flight < self.concurrency, self.timeout
+                )
+            finally:
+                self.queued -= 1
+            if not has_room:
+                self.shed += 1
+                return False
+            return self._admit()
+
+    def _admit(self):
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def metrics(self):
+        return {
+            'concurrency': self.concurrency,
+            'queue': self.queue,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'shed': self.shed,
+        }
+
+
+class AdmissionController:
+
+    def __init__(self, config):
+        self.retry_after = config['RETRY_AFTER']
+        self.table_config = config['TABLE']
+        self.endpoints = {
+            name: Slot(**self._slot_kwargs(endpoint))
+            for name, endpoint in config['ENDPOINTS'].items()
+        }
+        self.tables = {}
+        self.table_admitted = 0
+        self.table_shed = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _slot_kwargs(config):
+        return {
+            'concurrency': config['CONCURRENCY'],
+            'queue': config['QUEUE'],
+            'timeout': config['TIMEOUT'],
+        }
+
+    def _checkout_table(self, table):
+        with self.lock:
+            slot = self.tables.get(table)
+            if slot is None:
+                slot = Slot(**self._slot_kwargs(self.table_config))
+                self.tables[table] = slot
+            slot.users += 1
+            return slot
+
+    def _checkin_table(self, table, slot, outcome=None):
+        with self.lock:
+            if outcome == 'admitted':
+                self.table_admitted += 1
+            elif outcome == 'shed':
+                self.table_shed += 1
+            slot.users -= 1
+            if not slot.users:
+                del self.tables[table]
+
+    def admit(self, endpoint, table=None):
+        """
+        Waits for the slots of the request, returns a release callback
+        """
+        table_slot = None
+        if table is not None:
+            table_slot = self._checkout_table(table)
+            if not table_slot.acquire():
+                self._checkin_table(table, table_slot, 'shed')
+                raise Throttled(wait=self.retry_after)
+
+        endpoint_slot = self.endpoints[endpoint]
+        if not endpoint_slot.acquire():
+            if table_slot is not None:
+                table_slot.release()
+                self._checkin_table(table, table_slot)
+            raise Overloaded(wait=self.retry_after)
+
+        def release():
+            endpoint_slot.release()
+            if table_slot is not None:
+                table_slot.release()
+                self._checkin_table(table, table_slot, 'admitted')
+        return release
+
+    def metrics(self):
+        with self.lock:
+            tables = {
+                'active': len(self.tables),
+                'in_flight': sum(s.in_flight for s in self.tables.values()),
+                'queued': sum(s.queued for s in self.tables.values()),
+                'admitted': self.table_admitted,
+                'shed': self.table_shed,
+            }
+        return {
+            'endpoints': {
+                name: slot.metrics() for name, slot in self.endpoints.items()
+            },
+            'tables': tables,
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            config = {
+                **DEFAULTS,
+                **getattr(settings, 'SCHEMAS_ADMISSION', {}),
+            }
+            config['ENDPOINTS'] = {
+                **DEFAULTS['ENDPOINTS'],
+                **config['ENDPOINTS'],
+            }
+            _controller = AdmissionController(config)
+        return _controller
+
+
+@receiver(setting_changed)
+def reset_controller(setting, **kwargs):
+    global _controller
+    if setting == 'SCHEMAS_ADMISSION':
+        with _controller_lock:
+            _controller = None
+
+
+class AdmissionControlMixin:
+    """
+    Admits every request of a viewset through the admission controller
+    """
+    admission_release = None
+    # Endpoint class of every action, unknown actions are writes
+    admission_endpoints = ACTION_ENDPOINTS
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        endpoint = self.admission_endpoints.get(self.action, 'write')
+        table = kwargs.get(
+            getattr(self, 'lookup_url_kwarg', None)
+            or getattr(self, 'lookup_field', None)
+        )
+        self.admission_release = get_controller().admit(endpoint, table)
+
+    def dispatch(self, request, *args, **kwargs):
+        # Released here rather than in finalize_response, which DRF skips
+        # when the view raises an unhandled exception
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.admission_release is not None:
+                self.admission_release()
+                self.admission_release = None
@@ -0,0 +1,64 @@
+"""
+Incremental change feed of the simulated tables.
+
+Consumers read the ChangeEvent log from the last sequence number they saw
+instead of re-fetching every table. Reads long-poll: when there is nothing
+new the request waits for events up to a timeout. The log is kept bounded
+by compact_changes, configured with SCHEMAS_CHANGES.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ChangeEvent
+
+DEFAULTS = {
+    'BATCH_SIZE': 100,
+    'LONG_POLL_TIMEOUT': 25,
+    'POLL_INTERVAL': 0.25,
+    'RETENTION_SECONDS': 7 * 24 * 60 * 60,
+    'MAX_EVENTS': 1000000,
+    'COMPACT_AFTER_SECONDS': 60 * 60,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SCHEMAS_CHANGES', {})}
+
+
+def is_truncated(since):
+    """
+    Whether events after since were already deleted by the retention
+    """
+    return since < ChangeEvent.objects.purged_seq()
+
+
+def wait_for_changes(since, limit, timeout, poll_interval):
+    """
+    Returns up to limit events after since, waiting up to timeout seconds
+    for the first one, and whether more events are available
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        events = list(ChangeEvent.objects.filter(seq__gt=since)[:limit + 1])
+        if events or time.monotonic() >= deadline:
+            return events[:limit], len(events) > limit
+        time.sleep(poll_interval)
+
+
+def trim_log():
+    """
+    Applies retention and compaction, returns how many events were deleted
+    """
+    config = get_config()
+    now = timezone.now()
+    deleted = ChangeEvent.objects.purge(
+        max_age=timedelta(seconds=config['RETENTION_SECONDS']),
+        max_events=config['MAX_EVENTS'],
+    )
+    deleted += ChangeEvent.objects.compact(
+        horizon=now - timedelta(seconds=config['COMPACT_AFTER_SECONDS'])
+    )
+    return deleted
@@ -0,0 +1,85 @@
+"""
+Database routing for the schema API.
+
+Reads are balanced across the aliases in DATABASE_REPLICAS and writes go to
+the primary ('default'). Requests that write, and requests from clients that
+wrote in the last REPLICA_STICKY_SECONDS, read from the primary as well so a
+client always sees its own writes despite replication lag. Objects loaded
+from a shard keep reading and writing their related objects on it.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'schemas_use_primary'
+
+_state = threading.local()
+
+
+@contextmanager
+def use_primary():
+    """
+    Sends every read of the current thread to the primary
+    """
+    previous = getattr(_state, 'use_primary', False)
+    _state.use_primary = True
+    try:
+        yield
+    finally:
+        _state.use_primary = previous
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or getattr(_state, 'use_primary', False):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if (instance is not None and instance._state.db
+                and instance._state.db not in replicas):
+            return instance._state.db
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Pins writes, and the reads that follow them, to the primary
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in self.safe_methods
+        if writes or STICKY_COOKIE in request.COOKIES:
+            with use_primary():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+
+        if writes and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -10,7 +10,7 @@ class AttributeFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = Attribute
 
-    name = factory.LazyAttribute(lambda _: faker.word())
+    name = factory.Sequence(lambda n: f'{faker.word()}_{n}')
     attr_type = fuzzy.FuzzyChoice(
         ['str', 'int', 'bool', 'datetime', 'float']
     )
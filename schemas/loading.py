@@ -0,0 +1,366 @@
+"""
+Parallel bulk loading of rows into the simulated tables.
+
+Every input row becomes a new table shaped like a template table: same name
+and the same attributes, filled with the row's values. Input files (CSV with
+a header line, or JSON lines) are split into chunks of records in the main
+process; a pool of worker processes parses them and validates every value
+against the compiled schema of the template, and the main process is the
+single writer that bulk-inserts the accepted rows, chunk by chunk, in input
+order. Rejected rows are reported with their file and line.
+"""
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import django
+from django.db import transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import (
+    Table,
+    Attribute,
+    ColumnStatistics,
+    ChangeEvent,
+    DictionaryEntry,
+    ShardMap,
+    DATE_FORMAT,
+)
+from .snapshot import BulkLoader
+
+CHUNK_SIZE = 1000
+
+
+class LoadError(Exception):
+    pass
+
+
+def _parse_bool(raw_value):
+    if raw_value not in ('True', 'False'):
+        raise ValueError(raw_value)
+    return raw_value == 'True'
+
+
+def _parse_datetime(raw_value):
+    datetime.strptime(raw_value, DATE_FORMAT)
+    return raw_value
+
+
+# Converts CSV cells to the python value the API would have received
+CSV_CONVERTERS = {
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': _parse_bool,
+    'datetime': _parse_datetime,
+}
+
+
+class Column:
+
+    def __init__(self, name, attr_type, required, unique, encoding):
+        self.name = name
+        self.attr_type = attr_type
+        self.required = required
+        self.unique = unique
+        self.encoding = encoding
+
+
+class CompiledSchema:
+    """
+    Columns of a template table, checked by the workers without touching the
+    database
+    """
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = columns
+        self.by_name = {column.name: column for column in columns}
+        self.validators = {
+            column.name: Attribute(attr_type=column.attr_type)
+            for column in columns
+        }
+
+    @classmethod
+    def from_table(cls, table):
+        attributes = Attribute.objects.db_manager(table._state.db).filter(
+            table=table
+        ).order_by('id')
+        return cls(table.name, [
+            Column(
+                attribute.name,
+                attribute.attr_type,
+                attribute.required,
+                attribute.unique,
+                attribute.encoding,
+            )
+            for attribute in attributes
+        ])
+
+    def __getstate__(self):
+        return {'name': self.name, 'columns': self.columns}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['columns'])
+
+    def unknown_columns(self, names):
+        return [name for name in names if name not in self.by_name]
+
+    def validate(self, record, converted=False):
+        """
+        Returns the values of a {name: value} record, raises ValueError
+        with the same messages as the API
+        """
+        unknown = self.unknown_columns(record)
+        if unknown:
+            raise ValueError(f'Unknown attribute {unknown[0]}')
+        values = {}
+        for column in self.columns:
+            value = record.get(column.name)
+            if value is None or (converted and value == ''):
+                if column.required:
+                    raise ValueError(
+                        f'The attribute {column.name} is required'
+                    )
+                continue
+            if converted:
+                try:
+                    value = CSV_CONVERTERS[column.attr_type](value)
+                except ValueError:
+                    value = None
+            if not self.validators[column.name].validate_attr_type(value):
+                raise ValueError(
+                    f'Attribute type for {column.name} does not match'
+                )
+            values[column.name] = value
+        return values
+
+
+def parse_chunk(schema, chunk):
+    """
+    Parses and validates the (line, text) records of a chunk, returns its
+    path, the accepted value dicts and the (line, error) rejects
+    """
+    path, file_format, header, records = chunk
+    rows = []
+    rejects = []
+    for line, text in records:
+        try:
+            if file_format == 'csv':
+                cells = next(csv.reader([text]))
+                if len(cells) != len(header):
+                    raise ValueError(
+                        f'Expected {len(header)} fields, found {len(cells)}'
+                    )
+                rows.append(
+                    schema.validate(dict(zip(header, cells)), converted=True)
+                )
+            else:
+                try:
+                    record = json.loads(text)
+                except ValueError as e:
+                    raise ValueError(f'Invalid JSON: {e}')
+                if not isinstance(record, dict):
+                    raise ValueError('Expected a JSON object')
+                rows.append(schema.validate(record))
+        except ValueError as e:
+            rejects.append((line, str(e)))
+    return path, rows, rejects
+
+
+def read_records(path, file_format):
+    """
+    Yields the (line, text) records of a file, CSV records may span lines
+    inside quoted fields
+    """
+    with open(path, newline='', encoding='utf-8') as stream:
+        record = ''
+        start = None
+        for line, text in enumerate(stream, 1):
+            if not record:
+                start = line
+            record += text
+            # An odd number of quotes leaves a quoted field open
+            if file_format == 'csv' and record.count('"') % 2:
+                continue
+            record = record.rstrip('\r\n')
+            if record.strip():
+                yield start, record
+            record = ''
+        if record.strip():
+            yield start, record
+
+
+def file_format_of(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise LoadError(f'{path} is not a .csv or .jsonl file')
+
+
+def read_chunks(path, schema, chunk_size=CHUNK_SIZE):
+    """
+    Yields (path, format, header, records) chunks of a file
+    """
+    file_format = file_format_of(path)
+    records = read_records(path, file_format)
+    header = None
+    if file_format == 'csv':
+        first = next(records, None)
+        if first is None:
+            return
+        header = next(csv.reader([first[1]]))
+        unknown = schema.unknown_columns(header)
+        if unknown:
+            raise LoadError(f'{path}: unknown attribute {unknown[0]}')
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield path, file_format, header, chunk
+
+
+def parse_in_parallel(schema, chunks, workers):
+    """
+    Yields parse_chunk results in input order, keeping at most two chunks
+    per worker in flight
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield parse_chunk(schema, chunk)
+        return
+    with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, schema, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class RowWriter:
+    """
+    Inserts validated rows as new tables, one transaction per chunk
+    """
+
+    TABLE_COLUMNS = ('id', 'name', 'active', 'created_at', 'updated_at')
+    ATTRIBUTE_COLUMNS = (
+        'table_id', 'name', 'attr_type', 'attr_value', 'unique', 'required',
+        'encoding', 'active', 'created_at', 'updated_at',
+    )
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.loaders = {}
+
+    def loader(self, model, database):
+        if (model, database) not in self.loaders:
+            columns = self.ATTRIBUTE_COLUMNS
+            if model is Table:
+                columns = self.TABLE_COLUMNS
+            self.loaders[model, database] = BulkLoader(
+                model, database, columns
+            )
+        return self.loaders[model, database]
+
+    def write(self, rows):
+        if not rows:
+            return []
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            entries = ShardMap.objects.allocate(len(rows))
+            table_ids = [entry.table_id for entry in entries]
+            by_database = {}
+            for entry, row in zip(entries, rows):
+                by_database.setdefault(entry.database, []).append(
+                    (entry.table_id, row)
+                )
+            for database, tables in by_database.items():
+                with transaction.atomic(using=database):
+                    self.write_shard(database, tables)
+            ChangeEvent.objects.record_many(
+                event for table_id, row in zip(table_ids, rows)
+                for event in self.change_events(table_id, row)
+            )
+        return table_ids
+
+    def write_shard(self, database, tables):
+        codes = {}
+        for column in self.schema.columns:
+            if column.encoding == Attribute.DICTIONARY:
+                codes[column.name] = DictionaryEntry.objects.db_manager(
+                    database
+                ).encode(column.name, [
+                    str(row[column.name]) for _, row in tables
+                    if column.name in row
+                ])
+
+        # Rows go straight to executemany, building model instances would
+        # cost more than parsing them
+        now = timezone.now()
+        self.loader(Table, database).load(
+            {'id': table_id, 'name': self.schema.name, 'active': True,
+             'created_at': now, 'updated_at': now}
+            for table_id, _ in tables
+        )
+        attributes = []
+        for table_id, row in tables:
+            for column in self.schema.columns:
+                attr_value = None
+                if column.name in row:
+                    attr_value = str(row[column.name])
+                    if column.name in codes:
+                        attr_value = codes[column.name][attr_value]
+                attributes.append({
+                    'table_id': table_id,
+                    'name': column.name,
+                    'attr_type': column.attr_type,
+                    'attr_value': attr_value,
+                    'unique': column.unique,
+                    'required': column.required,
+                    'encoding': column.encoding,
+                    'active': True,
+                    'created_at': now,
+                    'updated_at': now,
+                })
+        self.loader(Attribute, database).load(attributes)
+        ColumnStatistics.objects.db_manager(database).record_modifications(
+            [column.name for column in self.schema.columns], len(tables),
+            encoded=list(codes)
+        )
+
+    def change_events(self, table_id, row):
+        yield ChangeEvent.TABLE_CREATE, table_id, {
+            'name': self.schema.name,
+            'fields': [
+                {
+                    'name': column.name,
+                    'attr_type': column.attr_type,
+                    'unique': column.unique,
+                    'required': column.required,
+                }
+                for column in self.schema.columns
+            ],
+        }
+        yield ChangeEvent.ROW_INSERT, table_id, {'values': row}
+
+
+def load_files(table, paths, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Loads every file as new tables shaped like table, yields
+    (path, loaded table ids, rejects) per chunk in input order
+    """
+    schema = CompiledSchema.from_table(table)
+    writer = RowWriter(schema)
+    chunks = (
+        chunk for path in paths
+        for chunk in read_chunks(path, schema, chunk_size)
+    )
+    for path, rows, rejects in parse_in_parallel(schema, chunks, workers):
+        yield path, writer.write(rows), rejects
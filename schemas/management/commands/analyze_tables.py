@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from schemas.models import ColumnStatistics
+from schemas.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = 'Collects the column statistics used to plan attribute filters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'columns', nargs='*',
+            help='Attribute names to analyze, every column by default',
+        )
+        parser.add_argument(
+            '--stale', action='store_true',
+            help='Only refresh columns modified since they were analyzed',
+        )
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Shard to analyze, every shard by default',
+        )
+
+    def handle(self, *args, **options):
+        for database in options['databases'] or get_shards():
+            self.analyze(database, options)
+
+    def analyze(self, database, options):
+        statistics = ColumnStatistics.objects.db_manager(database)
+        names = options['columns'] or None
+        if options['stale']:
+            names = [stats.name for stats in statistics.stale()]
+            if options['columns']:
+                names = [name for name in names if name in options['columns']]
+            if not names:
+                self.stdout.write(f'{database}: no stale columns')
+                return
+
+        for stats in statistics.analyze(names):
+            self.stdout.write(
+                f'{database}: {stats.name}: {stats.row_count} rows, '
+                f'{stats.distinct_count} distinct, '
+                f'{stats.null_fraction:.2%} null'
+            )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from schemas.changes import trim_log
+
+
+class Command(BaseCommand):
+    help = 'Applies the change log retention and compacts old events'
+
+    def handle(self, *args, **options):
+        deleted = trim_log()
+        self.stdout.write(f'Deleted {deleted} change events')
@@ -0,0 +1,61 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from schemas.loading import load_files, file_format_of, LoadError, CHUNK_SIZE
+from schemas.models import Table
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads CSV or JSON lines files as new tables shaped like a template '
+        'table, parsing them on a pool of worker processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'table_id', type=int,
+            help='Table whose name and attributes the loaded rows get',
+        )
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Parsing processes, one per core by default',
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            table = Table.objects.on_shard_of(options['table_id']).get(
+                pk=options['table_id']
+            )
+        except Table.DoesNotExist:
+            raise CommandError(f"Table {options['table_id']} does not exist")
+        for path in options['paths']:
+            if not os.path.isfile(path):
+                raise CommandError(f'{path} does not exist')
+            try:
+                file_format_of(path)
+            except LoadError as e:
+                raise CommandError(e.args[0])
+
+        loaded = rejected = 0
+        started = time.perf_counter()
+        try:
+            for path, table_ids, rejects in load_files(
+                table, options['paths'], options['workers'],
+                options['chunk_size'],
+            ):
+                loaded += len(table_ids)
+                rejected += len(rejects)
+                for line, error in rejects:
+                    self.stderr.write(f'{path}:{line}: {error}')
+        except LoadError as e:
+            raise CommandError(e.args[0])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'Loaded {loaded} rows, rejected {rejected} in {elapsed:.2f} s '
+            f'({loaded / elapsed if elapsed else 0:.0f} rows/s)'
+        )
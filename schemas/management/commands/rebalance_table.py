@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from schemas.models import Table
+from schemas.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = 'Moves simulated tables, with their attributes, to another shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table_ids', nargs='+', type=int)
+        parser.add_argument(
+            '--to', dest='database', required=True,
+            help='Shard the tables are moved to',
+        )
+
+    def handle(self, *args, **options):
+        database = options['database']
+        if database not in get_shards():
+            raise CommandError(f'{database} is not in SCHEMAS_SHARDS')
+
+        for table_id in options['table_ids']:
+            try:
+                moved = Table.objects.move_table(table_id, database)
+            except Table.DoesNotExist:
+                raise CommandError(f'Table {table_id} does not exist')
+            except ValueError as e:
+                raise CommandError(e.args[0])
+            if moved:
+                self.stdout.write(f'Moved table {table_id} to {database}')
+            else:
+                self.stdout.write(f'Table {table_id} is already on {database}')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from schemas.snapshot import restore_snapshot, SnapshotError
+
+
+class Command(BaseCommand):
+    help = 'Bulk-loads a snapshot written by snapshot_tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        try:
+            counts = restore_snapshot(options['path'])
+        except (OSError, IntegrityError, SnapshotError) as e:
+            raise CommandError(e)
+        self.stdout.write(
+            f"Restored {counts['tables']} tables, {counts['attributes']} "
+            f"attributes and {counts['relations']} relations"
+        )
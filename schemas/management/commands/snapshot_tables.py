@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from schemas.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Writes a compressed, column-oriented snapshot of the tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help='Shard to snapshot, every shard by default',
+        )
+
+    def handle(self, *args, **options):
+        counts = write_snapshot(options['path'], options['databases'])
+        self.stdout.write(
+            f"Wrote {counts['tables']} tables, {counts['attributes']} "
+            f"attributes and {counts['relations']} relations"
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemas', '0005_auto_20210219_1739'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColumnStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('attr_type', models.CharField(choices=[('str', 'String'), ('int', 'Integer'), ('float', 'Float'), ('datetime', 'Datetime'), ('bool', 'Boolean')], default='str', max_length=8)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('null_count', models.PositiveIntegerField(default=0)),
+                ('distinct_count', models.PositiveIntegerField(default=0)),
+                ('min_value', models.CharField(max_length=100, null=True)),
+                ('max_value', models.CharField(max_length=100, null=True)),
+                ('histogram', models.JSONField(default=list)),
+                ('modifications', models.PositiveIntegerField(default=0)),
+                ('analyzed_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attribute',
+            index=models.Index(fields=['name', 'attr_value'], name='schemas_att_name_d62ab5_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemas', '0006_column_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardMap',
+            fields=[
+                ('table_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('database', models.CharField(max_length=100)),
+            ],
+        ),
+    ]
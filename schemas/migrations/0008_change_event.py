@@ -0,0 +1,26 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemas', '0007_shard_map'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('table_create', 'Table created'), ('table_drop', 'Table dropped'), ('schema_change', 'Schema changed'), ('row_insert', 'Row inserted'), ('row_update', 'Row updated')], max_length=16)),
+                ('table_id', models.PositiveIntegerField()),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ('seq',),
+            },
+        ),
+    ]
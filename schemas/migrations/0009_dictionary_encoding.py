@@ -0,0 +1,30 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemas', '0008_change_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attribute',
+            name='encoding',
+            field=models.CharField(choices=[('plain', 'Plain'), ('dictionary', 'Dictionary')], default='plain', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='DictionaryEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('code', models.PositiveIntegerField()),
+                ('value', models.CharField(max_length=100)),
+            ],
+            options={
+                'unique_together': {('name', 'code'), ('name', 'value')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.6 on 2026-10-19 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemas', '0009_dictionary_encoding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(db_index=True, max_length=40)),
+                ('sql', models.TextField()),
+                ('params', models.JSONField(default=list)),
+                ('duration_ms', models.FloatField()),
+                ('database', models.CharField(max_length=100)),
+                ('view', models.CharField(blank=True, max_length=100)),
+                ('action', models.CharField(blank=True, max_length=100)),
+                ('plan', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('-id',),
+            },
+        ),
+    ]
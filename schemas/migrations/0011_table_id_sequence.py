@@ -0,0 +1,52 @@
+# Generated by Django 3.1.6 on 2026-10-19 17:10
+
+from django.db import migrations, models, DEFAULT_DB_ALIAS
+from django.db.models import Max
+
+
+def seed_sequence(apps, schema_editor):
+    """
+    Starts the sequence after every id handed out so far, including the ids
+    of dropped tables still counted by SQLite's AUTOINCREMENT
+    """
+    connection = schema_editor.connection
+    if connection.alias != DEFAULT_DB_ALIAS:
+        return
+    Table = apps.get_model('schemas', 'Table')
+    ShardMap = apps.get_model('schemas', 'ShardMap')
+    TableIdSequence = apps.get_model('schemas', 'TableIdSequence')
+    last_ids = [
+        Table.objects.using(connection.alias).aggregate(last=Max('id'))['last'],
+        ShardMap.objects.using(connection.alias).aggregate(
+            last=Max('table_id')
+        )['last'],
+    ]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = %s",
+                [Table._meta.db_table]
+            )
+            row = cursor.fetchone()
+            last_ids.append(row[0] if row else None)
+    TableIdSequence.objects.using(connection.alias).create(
+        pk=1, last_id=max(last_id or 0 for last_id in last_ids)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemas', '0010_slow_query'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableIdSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_id', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequence, migrations.RunPython.noop),
+    ]
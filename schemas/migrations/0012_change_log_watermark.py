@@ -0,0 +1,39 @@
+# Generated by Django 3.1.6 on 2026-10-19 17:20
+
+from django.db import migrations, models, DEFAULT_DB_ALIAS
+from django.db.models import Min
+
+
+def seed_watermark(apps, schema_editor):
+    """
+    Events before the earliest one left may have been purged already
+    """
+    connection = schema_editor.connection
+    if connection.alias != DEFAULT_DB_ALIAS:
+        return
+    ChangeEvent = apps.get_model('schemas', 'ChangeEvent')
+    ChangeLogWatermark = apps.get_model('schemas', 'ChangeLogWatermark')
+    earliest = ChangeEvent.objects.using(connection.alias).aggregate(
+        earliest=Min('seq')
+    )['earliest']
+    ChangeLogWatermark.objects.using(connection.alias).create(
+        pk=1, purged_seq=earliest - 1 if earliest else 0
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemas', '0011_table_id_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purged_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_watermark, migrations.RunPython.noop),
+    ]
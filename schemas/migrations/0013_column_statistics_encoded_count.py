@@ -0,0 +1,36 @@
+# Generated by Django 3.1.6 on 2026-10-19 17:24
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_encoded(apps, schema_editor):
+    """
+    Statistics analyzed before the count existed would skip the dictionary
+    """
+    alias = schema_editor.connection.alias
+    Attribute = apps.get_model('schemas', 'Attribute')
+    ColumnStatistics = apps.get_model('schemas', 'ColumnStatistics')
+    counts = Attribute.objects.using(alias).filter(
+        encoding='dictionary'
+    ).values('name').annotate(count=Count('id')).order_by()
+    for row in counts:
+        ColumnStatistics.objects.using(alias).filter(
+            name=row['name']
+        ).update(encoded_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schemas', '0012_change_log_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='columnstatistics',
+            name='encoded_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_encoded, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,43 @@
-from django.db import models
-from django.db.models import Q
+from django.db import (
+    models,
+    router,
+    transaction,
+    IntegrityError,
+    DEFAULT_DB_ALIAS,
+)
+from django.db.models import Avg, Case, Count, F, Max, Q, Sum, When
+from django.utils import timezone
+from contextlib import ExitStack
 from datetime import datetime
 
+from .planner import build_plan
+from .sharding import (
+    get_shards,
+    place_table,
+    routed_alias,
+    ShardedQuerySet,
+)
+
+DATE_FORMAT = '%d/%m/%Y'
+
+
+def parse_bool(raw_value):
+    return True if raw_value == 'True' else False
+
+
+def parse_datetime(raw_value):
+    return datetime.strptime(raw_value, DATE_FORMAT)
+
+
+# Converts a stored attr_value back into its python type, unknown types are
+# returned as the stored string.
+ATTR_TYPE_PARSERS = {
+    'int': int,
+    'float': float,
+    'bool': parse_bool,
+    'datetime': parse_datetime,
+}
+
 
 class DateTimeActiveModel(models.Model):
     active = models.BooleanField(default=True)
@@ -14,9 +50,46 @@ class DateTimeActiveModel(models.Model):
 
 class TableManager(models.Manager):
 
+    def shards(self):
+        """
+        Returns a manager bound to every shard
+        """
+        return [self.db_manager(routed_alias(alias)) for alias in get_shards()]
+
+    def on_shard_of(self, table_id):
+        return self.db_manager(
+            routed_alias(ShardMap.objects.database_for(table_id))
+        )
+
+    def all_shards(self):
+        """
+        Returns every table, merged across shards in creation order
+        """
+        shards = self.shards()
+        if len(shards) == 1:
+            return shards[0].all()
+        return ShardedQuerySet(
+            [manager.order_by('created_at', 'id') for manager in shards],
+            key=self.ordering_key
+        )
+
+    @staticmethod
+    def ordering_key(table):
+        """
+        Order of table lists, the same on one shard or merged across shards
+        """
+        return (table.created_at, table.pk)
+
     def create_table_with_attributes(self, name, attribute_list):
-        table = Table(name=name)
-        table.save()
+        entry = ShardMap.objects.allocate()[0]
+        using = routed_alias(entry.database)
+        table = Table(id=entry.table_id, name=name)
+        table.save(using=using, force_insert=True)
+        statistics = ColumnStatistics.objects.db_manager(using).in_bulk(
+            [attribute.get('name') for attribute in attribute_list],
+            field_name='name'
+        )
+        new_attributes = []
         for attribute in attribute_list:
             new_attribute = Attribute(
                 name=attribute.get('name'),
@@ -25,33 +98,157 @@ class TableManager(models.Manager):
                 attr_type=attribute.get('attr_type'),
                 table=table
             )
-            new_attribute.save()
+            new_attribute.encoding = new_attribute.choose_encoding(
+                attribute.get('encoding'),
+                statistics.get(new_attribute.name)
+            )
+            new_attributes.append(new_attribute)
+        Attribute.objects.db_manager(using).bulk_create(new_attributes)
+        ColumnStatistics.objects.db_manager(using).record_modifications(
+            [attribute.get('name') for attribute in attribute_list],
+            encoded=[
+                attribute.name for attribute in new_attributes
+                if attribute.encoding == Attribute.DICTIONARY
+            ]
+        )
+        ChangeEvent.objects.record(
+            ChangeEvent.TABLE_CREATE, table.pk, {
+                'name': name,
+                'fields': [
+                    {
+                        'name': attribute.get('name'),
+                        'attr_type': attribute.get('attr_type'),
+                        'unique': attribute.get('unique', False),
+                        'required': attribute.get('required', False),
+                    }
+                    for attribute in attribute_list
+                ],
+            }
+        )
         return table
 
+    def move_table(self, table_id, database):
+        """
+        Copies a table and its attributes to another shard, repoints the
+        shard map and deletes the original
+        """
+        source = ShardMap.objects.database_for(table_id)
+        if source == database:
+            return False
+        table = Table.objects.using(source).get(pk=table_id)
+        if (table.related_tables.exists()
+                or table.related_schemas.exists()):
+            raise ValueError(
+                f"Table {table_id} has related tables on its shard"
+            )
+        attributes = list(
+            Attribute.objects.using(source).filter(table=table).order_by('id')
+        )
+
+        with ExitStack() as stack:
+            for alias in {source, database, DEFAULT_DB_ALIAS}:
+                stack.enter_context(transaction.atomic(using=alias))
+            # raw keeps created_at and updated_at as they were
+            table.save_base(raw=True, force_insert=True, using=database)
+            # Dictionary codes are local to each shard as well
+            DictionaryEntry.objects.recode(attributes, source, database)
+            for attribute in attributes:
+                # Attribute ids are local to each shard
+                attribute.pk = None
+                attribute.save_base(
+                    raw=True, force_insert=True, using=database
+                )
+            ShardMap.objects.update_or_create(
+                table_id=table.pk, defaults={'database': database}
+            )
+            Table.objects.using(source).filter(pk=table.pk).delete()
+
+        names = [attribute.name for attribute in attributes]
+        ColumnStatistics.objects.db_manager(source).record_modifications(
+            names
+        )
+        ColumnStatistics.objects.db_manager(database).record_modifications(
+            names, encoded=[
+                attribute.name for attribute in attributes
+                if attribute.encoding == Attribute.DICTIONARY
+            ]
+        )
+        return True
+
     def validate_required(self, required_attrs, attribute_list):
         for attribute in required_attrs:
             if attribute[0] not in attribute_list.keys():  # Required
                 raise ValueError(f"The attribute {attribute[0]} is required")
 
     def insert_data(self, table_id, attribute_list):
-        required_attrs = Attribute.objects.filter(
-            table=table_id, required=True).values_list('name')
-        self.validate_required(required_attrs, attribute_list)
+        attributes = Attribute.objects.db_manager(self._db)
+        columns = {
+            attribute.name: attribute
+            for attribute in attributes.filter(table=table_id)
+        }
+        self.validate_required(
+            [(name, ) for name, attribute in columns.items()
+             if attribute.required],
+            attribute_list
+        )
+        has_data = any(
+            attribute.attr_value is not None for attribute in columns.values()
+        )
+        now = timezone.now()
+        changed = []
         for key, value in attribute_list.items():
-            attribute = Attribute.objects.get(name=key, table=table_id)
+            if key not in columns:
+                raise ValueError(f"Unknown attribute {key}")
+            attribute = columns[key]
             attribute.value = value
-            attribute.save()
+            attribute.updated_at = now
+            changed.append(attribute)
+        attributes.bulk_update(changed, ['attr_value', 'updated_at'])
+        ColumnStatistics.objects.db_manager(
+            self._db
+        ).record_modifications(attribute_list.keys())
+        ChangeEvent.objects.record(
+            ChangeEvent.ROW_UPDATE if has_data else ChangeEvent.ROW_INSERT,
+            table_id,
+            {'values': dict(attribute_list)}
+        )
+
+    def plan_filter(self, attribute_list):
+        statistics = ColumnStatistics.objects.db_manager(self._db).in_bulk(
+            attribute_list.keys(), field_name='name'
+        )
+        return build_plan(attribute_list.items(), statistics)
 
     def filter_by_attr(self, attribute_list):
-        query_obj = Q()
-        for name, value in attribute_list.items():
-            query_obj = query_obj | Q(name=name, attr_value=value)
+        """
+        Returns the table of every attribute matching any of the filters
+        """
+        if not attribute_list:
+            return []
 
-        attrs = Attribute.objects.filter(
-            query_obj
-        ).prefetch_related('table')
+        statistics = ColumnStatistics.objects.db_manager(self._db).in_bulk(
+            attribute_list.keys(), field_name='name'
+        )
+        dictionary = DictionaryEntry.objects.db_manager(self._db)
+        query = Q()
+        for name, value in attribute_list.items():
+            stored = Q(encoding=Attribute.PLAIN, attr_value=value)
+            # Dictionary encoded attributes store the code of the value,
+            # columns not analyzed yet may have some
+            column = statistics.get(name)
+            if column is None or column.encoded_count:
+                code = dictionary.lookup_codes(name, [value]).get(value)
+                if code is not None:
+                    stored |= Q(
+                        encoding=Attribute.DICTIONARY, attr_value=code
+                    )
+            query |= Q(stored, name=name)
+        matches = list(Attribute.objects.db_manager(self._db).filter(
+            query
+        ).order_by('id').values_list('table', flat=True))
 
-        return [attr.table for attr in attrs]
+        tables = self.in_bulk(set(matches))
+        return [tables[table_id] for table_id in matches]
 
 
 class Table(DateTimeActiveModel):
@@ -75,6 +272,12 @@ class Attribute(DateTimeActiveModel):
         ('datetime', 'Datetime'),
         ('bool', 'Boolean'),
     )
+    PLAIN = 'plain'
+    DICTIONARY = 'dictionary'
+    encoding_choices = (
+        (PLAIN, 'Plain'),
+        (DICTIONARY, 'Dictionary'),
+    )
     name = models.CharField(max_length=100)
     attr_value = models.CharField(max_length=100, null=True)
     attr_type = models.CharField(
@@ -84,27 +287,53 @@ class Attribute(DateTimeActiveModel):
     )
     unique = models.BooleanField(default=False)
     required = models.BooleanField(default=False)
+    encoding = models.CharField(
+        choices=encoding_choices,
+        max_length=10,
+        default=PLAIN
+    )
     table = models.ForeignKey(
         to=Table,
         related_name="table_attrs",
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'attr_value']),
+        ]
+
     def __str__(self):
         return self.name
 
+    def choose_encoding(self, encoding=None, statistics=None):
+        """
+        Dictionary encoding is only used for strings, when asked for or when
+        the column statistics show few distinct values
+        """
+        if self.attr_type != 'str':
+            return self.PLAIN
+        if encoding is not None:
+            return encoding
+        if statistics is not None and statistics.recommends_dictionary:
+            return self.DICTIONARY
+        return self.PLAIN
+
+    @property
+    def decoded_value(self):
+        if self.encoding == self.DICTIONARY and self.attr_value:
+            return DictionaryEntry.objects.db_manager(self._state.db).decode(
+                self.name, [self.attr_value]
+            ).get(self.attr_value)
+        return self.attr_value
+
     def transform_value_type(self):
-        if self.attr_value:
-            if self.attr_type == 'int':
-                return int(self.attr_value)
-            elif self.attr_type == 'float':
-                return float(self.attr_value)
-            elif self.attr_type == 'bool':
-                return True if self.attr_value == 'True' else False
-            elif self.attr_type == 'datetime':
-                return datetime.strptime(self.attr_value, '%d/%m/%Y')
-            else:
-                return self.attr_value
+        raw_value = self.decoded_value
+        if raw_value:
+            parser = ATTR_TYPE_PARSERS.get(self.attr_type)
+            if parser is None:
+                return raw_value
+            return parser(raw_value)
 
     @property
     def value(self):
@@ -116,6 +345,10 @@ class Attribute(DateTimeActiveModel):
     def value(self, new_value):
         if self.validate_attr_type(new_value):
             self.attr_value = str(new_value)
+            if self.encoding == self.DICTIONARY:
+                self.attr_value = DictionaryEntry.objects.db_manager(
+                    self._state.db
+                ).encode(self.name, [self.attr_value])[self.attr_value]
         else:
             raise ValueError(f"Attribute type for {self.name} does not match")
 
@@ -131,8 +364,589 @@ class Attribute(DateTimeActiveModel):
 
         if self.attr_type == 'datetime':
             try:
-                datetime.strptime(str(attribute), '%d/%m/%Y')
+                datetime.strptime(str(attribute), DATE_FORMAT)
             except ValueError:
                 obj_type = None
 
         return type(attribute) == obj_type
+
+
+class ColumnStatisticsManager(models.Manager):
+
+    def record_modifications(self, names, count=1, encoded=()):
+        """
+        Counts writes on analyzed columns so stale statistics can be refreshed,
+        and the new dictionary encoded attributes of the encoded columns
+        """
+        changes = {'modifications': F('modifications') + count}
+        if encoded:
+            changes['encoded_count'] = F('encoded_count') + Case(
+                When(name__in=list(encoded), then=count), default=0
+            )
+        self.filter(name__in=list(names)).update(**changes)
+
+    def stale(self):
+        return [stats for stats in self.all() if stats.is_stale]
+
+    def analyze(self, names=None):
+        """
+        Recomputes the statistics of the given columns, or of every column
+        """
+        attrs = Attribute.objects.db_manager(self._db).all()
+        if names is not None:
+            attrs = attrs.filter(name__in=list(names))
+        value_counts = list(attrs.values(
+            'name', 'attr_type', 'encoding', 'attr_value'
+        ).annotate(count=Count('id')).order_by())
+        decoded = DictionaryEntry.objects.db_manager(self._db).decode_pairs(
+            (row['name'], row['attr_value']) for row in value_counts
+            if row['encoding'] == Attribute.DICTIONARY
+        )
+
+        columns = {}
+        encoded_counts = {}
+        for row in value_counts:
+            column = columns.setdefault(row['name'], {})
+            attr_value = row['attr_value']
+            if row['encoding'] == Attribute.DICTIONARY:
+                encoded_counts[row['name']] = (
+                    encoded_counts.get(row['name'], 0) + row['count']
+                )
+                if attr_value:
+                    attr_value = decoded.get((row['name'], attr_value))
+            key = (row['attr_type'], attr_value)
+            column[key] = column.get(key, 0) + row['count']
+
+        analyzed = []
+        for name, column in columns.items():
+            stats, _ = self.get_or_create(name=name)
+            stats.compute(column)
+            stats.encoded_count = encoded_counts.get(name, 0)
+            stats.save()
+            analyzed.append(stats)
+
+        stale = self.exclude(name__in=columns.keys())
+        if names is not None:
+            stale = stale.filter(name__in=list(names))
+        stale.delete()
+        return analyzed
+
+
+class ColumnStatistics(models.Model):
+    """
+    Planner statistics of one simulated column, every attribute that shares
+    a name across tables
+    """
+    HISTOGRAM_SIZE = 10
+    STALE_FRACTION = 0.2
+    # String columns with at least DICTIONARY_MIN_ROWS values, of which at
+    # most DICTIONARY_MAX_DISTINCT are distinct, get dictionary encoded
+    DICTIONARY_MIN_ROWS = 100
+    DICTIONARY_MAX_DISTINCT = 0.1
+
+    name = models.CharField(max_length=100, unique=True)
+    attr_type = models.CharField(
+        choices=Attribute.attr_type_choices,
+        max_length=8,
+        default='str'
+    )
+    row_count = models.PositiveIntegerField(default=0)
+    null_count = models.PositiveIntegerField(default=0)
+    distinct_count = models.PositiveIntegerField(default=0)
+    min_value = models.CharField(max_length=100, null=True)
+    max_value = models.CharField(max_length=100, null=True)
+    histogram = models.JSONField(default=list)
+    modifications = models.PositiveIntegerField(default=0)
+    # Dictionary encoded attributes, columns without any never store codes
+    encoded_count = models.PositiveIntegerField(default=0)
+    analyzed_at = models.DateTimeField(null=True)
+    objects = ColumnStatisticsManager()
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def null_fraction(self):
+        if not self.row_count:
+            return 0.0
+        return self.null_count / self.row_count
+
+    @property
+    def is_stale(self):
+        return self.modifications > self.STALE_FRACTION * max(
+            self.row_count, 1
+        )
+
+    @property
+    def recommends_dictionary(self):
+        non_null_rows = self.row_count - self.null_count
+        return (
+            self.attr_type == 'str'
+            and non_null_rows >= self.DICTIONARY_MIN_ROWS
+            and self.distinct_count
+            <= self.DICTIONARY_MAX_DISTINCT * non_null_rows
+        )
+
+    def parse(self, raw_value):
+        parser = ATTR_TYPE_PARSERS.get(self.attr_type)
+        if parser is None:
+            return raw_value
+        try:
+            return parser(raw_value)
+        except ValueError:
+            return None
+
+    def compute(self, column):
+        """
+        Fills the statistics from a {(attr_type, attr_value): count} mapping
+        """
+        type_counts = {}
+        value_counts = {}
+        for (attr_type, attr_value), count in column.items():
+            type_counts[attr_type] = type_counts.get(attr_type, 0) + count
+            value_counts[attr_value] = value_counts.get(attr_value, 0) + count
+        self.attr_type = max(type_counts, key=type_counts.get)
+
+        self.row_count = sum(value_counts.values())
+        self.null_count = value_counts.pop(None, 0)
+        self.distinct_count = len(value_counts)
+
+        parsed = []
+        for raw_value in value_counts:
+            value = self.parse(raw_value)
+            if value is not None:
+                parsed.append((value, raw_value))
+        if parsed:
+            self.min_value = min(parsed)[1]
+            self.max_value = max(parsed)[1]
+        else:
+            self.min_value = self.max_value = None
+
+        most_common = sorted(
+            value_counts.items(), key=lambda item: item[1], reverse=True
+        )
+        self.histogram = [
+            [value, count]
+            for value, count in most_common[:self.HISTOGRAM_SIZE]
+        ]
+        self.modifications = 0
+        self.analyzed_at = timezone.now()
+
+    def frequency(self, raw_value):
+        """
+        Returns how many rows hold the value if it is in the histogram
+        """
+        for value, count in self.histogram:
+            if value == raw_value:
+                return count
+        return None
+
+    def is_out_of_range(self, raw_value):
+        if self.min_value is None:
+            return not self.distinct_count
+        value = self.parse(raw_value)
+        if value is None:
+            return False
+        low, high = self.parse(self.min_value), self.parse(self.max_value)
+        try:
+            return not low <= value <= high
+        except TypeError:
+            return False
+
+
+class ShardMapManager(models.Manager):
+    ALLOCATE_ATTEMPTS = 5
+
+    def get_queryset(self):
+        # The shard map is only kept on the primary
+        return super().get_queryset().using(DEFAULT_DB_ALIAS)
+
+    def database_for(self, table_id):
+        """
+        Returns the shard that owns the table, tables created before
+        sharding live on 'default'
+        """
+        database = self.filter(table_id=int(table_id)).values_list(
+            'database', flat=True
+        ).first()
+        return database or DEFAULT_DB_ALIAS
+
+    def next_table_id(self):
+        last_ids = [self.aggregate(last=Max('table_id'))['last']]
+        for alias in get_shards():
+            last_ids.append(
+                Table.objects.using(alias).aggregate(last=Max('id'))['last']
+            )
+        return max(last_id or 0 for last_id in last_ids) + 1
+
+    def allocate(self, count=1, database=None):
+        """
+        Reserves ids for new tables and places them on a shard, ids of
+        dropped tables are never handed out again
+        """
+        for attempt in range(self.ALLOCATE_ATTEMPTS):
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    sequence, _ = TableIdSequence.objects.select_for_update(
+                    ).get_or_create(pk=TableIdSequence.SINGLETON_ID)
+                    # Tables can also get ids outside allocate, e.g. from a
+                    # snapshot restore, so the sequence never falls behind
+                    first_id = max(
+                        sequence.last_id + 1, self.next_table_id()
+                    )
+                    sequence.last_id = first_id + count - 1
+                    sequence.save()
+                    entries = [
+                        ShardMap(
+                            table_id=table_id,
+                            database=database or place_table(table_id)
+                        )
+                        for table_id in range(first_id, first_id + count)
+                    ]
+                    return self.bulk_create(entries)
+            except IntegrityError:
+                # Another process reserved the same ids, try the next ones
+                if attempt == self.ALLOCATE_ATTEMPTS - 1:
+                    raise
+
+
+class TableIdSequenceManager(models.Manager):
+
+    def get_queryset(self):
+        # The sequence is only kept on the primary, next to the shard map
+        return super().get_queryset().using(DEFAULT_DB_ALIAS)
+
+
+class TableIdSequence(models.Model):
+    """
+    Last table id handed out by ShardMap.objects.allocate
+    """
+    SINGLETON_ID = 1
+
+    last_id = models.PositiveIntegerField(default=0)
+    objects = TableIdSequenceManager()
+
+    def __str__(self):
+        return str(self.last_id)
+
+
+class ShardMap(models.Model):
+    """
+    Shard that owns each simulated table
+    """
+    table_id = models.PositiveIntegerField(primary_key=True)
+    database = models.CharField(max_length=100)
+    objects = ShardMapManager()
+
+    def __str__(self):
+        return f'{self.table_id} -> {self.database}'
+
+
+class ChangeEventManager(models.Manager):
+    DELETE_BATCH_SIZE = 500
+
+    def get_queryset(self):
+        # The change log is only kept on the primary
+        return super().get_queryset().using(DEFAULT_DB_ALIAS)
+
+    def record(self, kind, table_id, payload=None):
+        return self.create(kind=kind, table_id=table_id, payload=payload or {})
+
+    def record_many(self, events):
+        """
+        Records (kind, table_id, payload) events with a single insert
+        """
+        return self.bulk_create(
+            ChangeEvent(kind=kind, table_id=table_id, payload=payload or {})
+            for kind, table_id, payload in events
+        )
+
+    def head(self):
+        """
+        Returns the seq of the last event recorded
+        """
+        last = self.order_by('-seq').values_list('seq', flat=True).first()
+        return max(last or 0, self.purged_seq())
+
+    def purged_seq(self):
+        """
+        Returns the last seq deleted by purge, reading after it loses events
+        """
+        return ChangeLogWatermark.objects.filter(
+            pk=ChangeLogWatermark.SINGLETON_ID
+        ).values_list('purged_seq', flat=True).first() or 0
+
+    def purge(self, max_age, max_events):
+        """
+        Deletes events older than max_age and the oldest ones above
+        max_events, returns how many were deleted
+        """
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            expired = self.filter(created_at__lt=timezone.now() - max_age)
+            purged = expired.aggregate(last=Max('seq'))['last'] or 0
+            deleted, _ = expired.delete()
+            overflow = self.order_by('-seq').values_list(
+                'seq', flat=True
+            )[max_events:max_events + 1].first()
+            if overflow is not None:
+                overflowed, _ = self.filter(seq__lte=overflow).delete()
+                deleted += overflowed
+                purged = max(purged, overflow)
+
+            # Compaction deletes events too, only purges lose changes
+            watermark, _ = ChangeLogWatermark.objects.select_for_update(
+            ).get_or_create(pk=ChangeLogWatermark.SINGLETON_ID)
+            if purged > watermark.purged_seq:
+                watermark.purged_seq = purged
+                watermark.save(update_fields=['purged_seq'])
+        return deleted
+
+    def compact(self, horizon):
+        """
+        Rewrites the events older than horizon into the fewest events that
+        lead to the same state, returns how many were deleted
+        """
+        events = self.filter(created_at__lt=horizon).order_by('seq')
+        obsolete = set()
+        pending_rows = {}
+        for event in events.iterator():
+            if event.kind in ChangeEvent.ROW_KINDS:
+                previous = pending_rows.get(event.table_id)
+                if previous is not None:
+                    event.payload['values'] = {
+                        **previous.payload['values'],
+                        **event.payload['values'],
+                    }
+                    if previous.kind == ChangeEvent.ROW_INSERT:
+                        event.kind = ChangeEvent.ROW_INSERT
+                    obsolete.add(previous.seq)
+                    event.save(update_fields=['kind', 'payload'])
+                pending_rows[event.table_id] = event
+            elif event.kind == ChangeEvent.TABLE_DROP:
+                pending_rows.pop(event.table_id, None)
+                obsolete.update(events.filter(
+                    table_id=event.table_id, seq__lt=event.seq
+                ).values_list('seq', flat=True))
+
+        obsolete = sorted(obsolete)
+        deleted = 0
+        for start in range(0, len(obsolete), self.DELETE_BATCH_SIZE):
+            batch = obsolete[start:start + self.DELETE_BATCH_SIZE]
+            deleted += self.filter(seq__in=batch).delete()[0]
+        return deleted
+
+
+class ChangeEvent(models.Model):
+    """
+    Append-only log of changes to the simulated tables, ordered by seq
+    """
+    TABLE_CREATE = 'table_create'
+    TABLE_DROP = 'table_drop'
+    SCHEMA_CHANGE = 'schema_change'
+    ROW_INSERT = 'row_insert'
+    ROW_UPDATE = 'row_update'
+    ROW_KINDS = (ROW_INSERT, ROW_UPDATE)
+    kind_choices = (
+        (TABLE_CREATE, 'Table created'),
+        (TABLE_DROP, 'Table dropped'),
+        (SCHEMA_CHANGE, 'Schema changed'),
+        (ROW_INSERT, 'Row inserted'),
+        (ROW_UPDATE, 'Row updated'),
+    )
+
+    seq = models.BigAutoField(primary_key=True)
+    kind = models.CharField(choices=kind_choices, max_length=16)
+    table_id = models.PositiveIntegerField()
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    objects = ChangeEventManager()
+
+    class Meta:
+        ordering = ('seq', )
+
+    def __str__(self):
+        return f'{self.seq} {self.kind} {self.table_id}'
+
+
+class ChangeLogWatermarkManager(models.Manager):
+
+    def get_queryset(self):
+        # Kept on the primary, next to the change log
+        return super().get_queryset().using(DEFAULT_DB_ALIAS)
+
+
+class ChangeLogWatermark(models.Model):
+    """
+    Last ChangeEvent seq deleted by ChangeEvent.objects.purge
+    """
+    SINGLETON_ID = 1
+
+    purged_seq = models.BigIntegerField(default=0)
+    objects = ChangeLogWatermarkManager()
+
+    def __str__(self):
+        return str(self.purged_seq)
+
+
+class DictionaryEntryManager(models.Manager):
+    CREATE_ATTEMPTS = 5
+
+    def decode_pairs(self, pairs):
+        """
+        Returns the values of (name, code) pairs, codes are strings as
+        stored in attr_value
+        """
+        pairs = {(name, code) for name, code in pairs if code}
+        if not pairs:
+            return {}
+        entries = self.filter(
+            name__in={name for name, _ in pairs},
+            code__in={int(code) for _, code in pairs},
+        ).values_list('name', 'code', 'value')
+        decoded = {(name, str(code)): value for name, code, value in entries}
+        return {pair: decoded.get(pair) for pair in pairs}
+
+    def decode(self, name, codes):
+        return {
+            code: value
+            for (_, code), value in self.decode_pairs(
+                (name, code) for code in codes
+            ).items()
+        }
+
+    def lookup_codes(self, name, values):
+        """
+        Returns the codes of the values already in the dictionary
+        """
+        return {
+            value: str(code) for value, code in self.filter(
+                name=name, value__in=list(values)
+            ).values_list('value', 'code')
+        }
+
+    def encode(self, name, values):
+        """
+        Returns the code of every value, adding the missing ones
+        """
+        values = list(dict.fromkeys(values))
+        entries = self.db_manager(
+            self._db or router.db_for_write(self.model)
+        )
+        for attempt in range(self.CREATE_ATTEMPTS):
+            codes = entries.lookup_codes(name, values)
+            missing = [value for value in values if value not in codes]
+            if not missing:
+                return codes
+            try:
+                with transaction.atomic(using=entries.db):
+                    last_code = entries.filter(name=name).aggregate(
+                        last=Max('code')
+                    )['last'] or 0
+                    entries.bulk_create(
+                        DictionaryEntry(name=name, code=code, value=value)
+                        for code, value in enumerate(missing, last_code + 1)
+                    )
+            except IntegrityError:
+                # Another process added the same codes or values, read again
+                if attempt == self.CREATE_ATTEMPTS - 1:
+                    raise
+
+    def recode(self, attributes, source, database):
+        """
+        Rewrites the codes of encoded attributes moved between databases
+        """
+        encoded = [
+            attribute for attribute in attributes
+            if attribute.encoding == Attribute.DICTIONARY
+            and attribute.attr_value
+        ]
+        decoded = self.db_manager(source).decode_pairs(
+            (attribute.name, attribute.attr_value) for attribute in encoded
+        )
+        target = self.db_manager(database)
+        for attribute in encoded:
+            value = decoded[attribute.name, attribute.attr_value]
+            attribute.attr_value = target.encode(
+                attribute.name, [value]
+            )[value]
+
+
+class DictionaryEntry(models.Model):
+    """
+    Code of a value of a dictionary encoded column, codes are per database
+    """
+    name = models.CharField(max_length=100)
+    code = models.PositiveIntegerField()
+    value = models.CharField(max_length=100)
+    objects = DictionaryEntryManager()
+
+    class Meta:
+        unique_together = (('name', 'code'), ('name', 'value'))
+
+    def __str__(self):
+        return f'{self.name}: {self.code} -> {self.value}'
+
+
+class SlowQueryManager(models.Manager):
+
+    def get_queryset(self):
+        # The slow query log is only kept on the primary
+        return super().get_queryset().using(DEFAULT_DB_ALIAS)
+
+    def trim(self, max_entries):
+        """
+        Deletes the oldest entries above max_entries
+        """
+        overflow = self.order_by('-id').values_list(
+            'id', flat=True
+        )[max_entries:max_entries + 1].first()
+        if overflow is None:
+            return 0
+        return self.filter(id__lte=overflow).delete()[0]
+
+    def top_offenders(self, limit=20):
+        """
+        Aggregates the log by fingerprint, most total time first, with the
+        latest sample of every fingerprint
+        """
+        offenders = list(self.values('fingerprint').annotate(
+            count=Count('id'),
+            total_ms=Sum('duration_ms'),
+            avg_ms=Avg('duration_ms'),
+            max_ms=Max('duration_ms'),
+            last_id=Max('id'),
+        ).order_by('-total_ms')[:limit])
+        samples = self.in_bulk([offender['last_id'] for offender in offenders])
+        for offender in offenders:
+            sample = samples[offender.pop('last_id')]
+            offender.update({
+                'sql': sample.sql,
+                'database': sample.database,
+                'view': sample.view,
+                'action': sample.action,
+                'plan': sample.plan,
+                'last_seen': sample.created_at,
+            })
+        return offenders
+
+
+class SlowQuery(models.Model):
+    """
+    Query that ran above SCHEMAS_SLOW_QUERY_LOG['QUERY_THRESHOLD_MS']
+    """
+    fingerprint = models.CharField(max_length=40, db_index=True)
+    sql = models.TextField()
+    params = models.JSONField(default=list)
+    duration_ms = models.FloatField()
+    database = models.CharField(max_length=100)
+    view = models.CharField(max_length=100, blank=True)
+    action = models.CharField(max_length=100, blank=True)
+    plan = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    objects = SlowQueryManager()
+
+    class Meta:
+        ordering = ('-id', )
+
+    def __str__(self):
+        return f'{self.duration_ms:.1f} ms {self.sql[:80]}'
@@ -0,0 +1,96 @@
+"""
+Cost estimates of attribute filters.
+
+Every simulated column lives in the same attr_value column, so the database
+cannot tell which filter is the most selective. The planner uses the
+ColumnStatistics of each filtered column to estimate how many attributes
+match, and orders the filters from the most to the least selective.
+
+Plans are advisory, they are what ?explain=1 returns: filtering always runs
+every filter as one lookup on the (name, attr_value) index, whatever the
+estimates. Statistics go out of date between analyzes, so they never decide
+which rows are returned.
+"""
+
+
+class PlanStep:
+
+    def __init__(self, name, value, estimated_rows=None, selectivity=None):
+        self.name = name
+        self.value = value
+        self.estimated_rows = estimated_rows
+        self.selectivity = selectivity
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'value': self.value,
+            'estimated_rows': self.estimated_rows,
+            'selectivity': self.selectivity,
+        }
+
+
+class FilterPlan:
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    @property
+    def estimated_rows(self):
+        estimates = [step.estimated_rows for step in self.steps]
+        if None in estimates:
+            return None
+        return sum(estimates)
+
+    def as_dict(self):
+        return {
+            'estimated_rows': self.estimated_rows,
+            'steps': [step.as_dict() for step in self.steps],
+        }
+
+
+def estimate_rows(statistics, value):
+    """
+    Estimates how many attributes of the column hold the value
+    """
+    if statistics.is_out_of_range(value):
+        return 0
+    frequency = statistics.frequency(value)
+    if frequency is not None:
+        return frequency
+
+    histogram_rows = sum(count for _, count in statistics.histogram)
+    remaining_distinct = statistics.distinct_count - len(statistics.histogram)
+    if remaining_distinct <= 0:
+        return 0
+    remaining_rows = (
+        statistics.row_count - statistics.null_count - histogram_rows
+    )
+    return round(remaining_rows / remaining_distinct, 2)
+
+
+def plan_step(name, value, statistics):
+    if statistics is None:
+        return PlanStep(name, value)
+
+    estimated_rows = estimate_rows(statistics, value)
+    non_null_rows = statistics.row_count - statistics.null_count
+    selectivity = (
+        round(estimated_rows / non_null_rows, 4) if non_null_rows else 0.0
+    )
+    return PlanStep(name, value, estimated_rows, selectivity)
+
+
+def build_plan(predicates, statistics):
+    """
+    Plans (name, value) filters given the ColumnStatistics keyed by name
+    """
+    steps = [
+        plan_step(name, value, statistics.get(name))
+        for name, value in predicates
+    ]
+    steps.sort(key=lambda step: (
+        step.estimated_rows is None,
+        step.estimated_rows or 0,
+    ))
+    return FilterPlan(steps)
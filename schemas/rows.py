@@ -0,0 +1,64 @@
+"""
+Allocation-light rendering of table payloads.
+
+Builds the same payload as serializing every attribute through
+AttributeSerializer, straight from values_list tuples, with a single query
+per shard for all the tables being rendered.
+"""
+from .models import Attribute, DictionaryEntry, ATTR_TYPE_PARSERS
+
+
+def fetch_rows(table_ids, using=None, fields=None):
+    """
+    Returns the parsed attribute values of every table, keyed by table id,
+    restricted to the attribute names in fields when given
+    """
+    rows = {table_id: {} for table_id in table_ids}
+    if not rows:
+        return rows
+    values = Attribute.objects.db_manager(using).filter(
+        table__in=rows.keys()
+    )
+    if fields is not None:
+        values = values.filter(name__in=fields)
+    values = values.order_by('id').values_list(
+        'table', 'name', 'attr_type', 'encoding', 'attr_value'
+    )
+
+    decoded = DictionaryEntry.objects.db_manager(using).decode_pairs(
+        (name, attr_value)
+        for _, name, _, encoding, attr_value in values
+        if encoding == Attribute.DICTIONARY
+    )
+    parsers = ATTR_TYPE_PARSERS
+    for table_id, name, attr_type, encoding, attr_value in values:
+        if encoding == Attribute.DICTIONARY and attr_value:
+            attr_value = decoded[name, attr_value]
+        if attr_value:
+            parser = parsers.get(attr_type)
+            if parser is not None:
+                attr_value = parser(attr_value)
+        rows[table_id][name] = attr_value
+    return rows
+
+
+def render_tables(tables, fields=None):
+    """
+    Renders a list of tables, repeated tables share the same payload.
+    fields limits the payload to those keys, 'name' included
+    """
+    tables = list(tables)
+    shards = {}
+    for table in tables:
+        shards.setdefault(table._state.db, set()).add(table.pk)
+    rows = {}
+    for using, table_ids in shards.items():
+        rows.update(fetch_rows(table_ids, using, fields))
+    if fields is None or 'name' in fields:
+        for table in tables:
+            rows[table.pk]['name'] = table.name
+    return [rows[table.pk] for table in tables]
+
+
+def render_table(table, fields=None):
+    return render_tables([table], fields)[0]
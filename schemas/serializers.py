@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Table, Attribute
+from .models import Table, Attribute, ChangeEvent
+from .rows import render_table, render_tables
 
 
 class AttributeSchemaSerializer(serializers.ModelSerializer):
@@ -14,19 +15,20 @@ class AttributeSerializer(serializers.ModelSerializer):
         fields = ('name', 'value')
 
 
+class TableListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        return render_tables(data, self.context.get('fields'))
+
+
 class TableSerializer(serializers.ModelSerializer):
     class Meta:
         model = Table
         fields = ('name', )
+        list_serializer_class = TableListSerializer
 
     def to_representation(self, instance):
-        attrs_qs = instance.table_attrs.all()
-        serialized_data = [AttributeSerializer(attr).data for attr in attrs_qs]
-        data = {
-            attr['name']: attr['value'] for attr in serialized_data
-        }
-        data['name'] = instance.name
-        return data
+        return render_table(instance, self.context.get('fields'))
 
 
 class TableSchemaSerializer(serializers.ModelSerializer):
@@ -42,6 +44,24 @@ class TableSchemaSerializer(serializers.ModelSerializer):
             attribute_list=validated_data['fields']
         )
 
+    def validate_fields(self, value):
+        encodings = dict(Attribute.encoding_choices)
+        for field in value:
+            encoding = field.get('encoding')
+            if encoding is not None and encoding not in encodings:
+                raise serializers.ValidationError(
+                    f"Encoding {encoding} is not one of {', '.join(encodings)}"
+                )
+        return value
+
+    def update(self, instance, validated_data):
+        validated_data.pop('fields', None)
+        instance = super().update(instance, validated_data)
+        ChangeEvent.objects.record(
+            ChangeEvent.SCHEMA_CHANGE, instance.pk, {'name': instance.name}
+        )
+        return instance
+
     def to_representation(self, instance):
         attrs_qs = instance.table_attrs.all()
         serializer = AttributeSchemaSerializer(attrs_qs, many=True).data
@@ -49,3 +69,9 @@ class TableSchemaSerializer(serializers.ModelSerializer):
             'name': instance.name,
             'fields': serializer
         }
+
+
+class ChangeEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChangeEvent
+        fields = ('seq', 'kind', 'table_id', 'payload', 'created_at')
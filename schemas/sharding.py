@@ -0,0 +1,64 @@
+"""
+Horizontal sharding of simulated tables.
+
+Every table, with its attributes and column statistics, lives on one of the
+database aliases in SCHEMAS_SHARDS. The ShardMap on 'default' records which
+one, keyed by table id, so ids are unique across shards. Tables on 'default'
+keep going through the database routers, so they can be read from replicas.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+def get_shards():
+    return list(getattr(settings, 'SCHEMAS_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def place_table(table_id):
+    """
+    Returns the shard a new table is placed on
+    """
+    shards = get_shards()
+    return shards[table_id % len(shards)]
+
+
+def routed_alias(alias):
+    """
+    Alias to bind managers and querysets to, None lets the routers decide
+    """
+    return None if alias == DEFAULT_DB_ALIAS else alias
+
+
+class ShardedQuerySet:
+    """
+    Read-only view of the same query on several shards, merged by key.
+
+    Supports what pagination needs: count(), len() and slicing. A slice
+    fetches up to its stop from every shard and merges them.
+    """
+
+    def __init__(self, querysets, key):
+        self.querysets = querysets
+        self.key = key
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return heapq.merge(*self.querysets, key=self.key)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            parts = self.querysets
+        else:
+            parts = [list(queryset[:stop]) for queryset in self.querysets]
+        return list(islice(heapq.merge(*parts, key=self.key), start, stop))
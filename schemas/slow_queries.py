@@ -0,0 +1,179 @@
+"""
+Slow request and slow query log.
+
+SlowQueryLogMiddleware times every query a request runs, on every database.
+Queries above QUERY_THRESHOLD_MS are stored as SlowQuery entries with their
+normalised SQL, a fingerprint grouping queries that only differ by their
+literals, the parameters, the duration, the view action that ran them and,
+for reads, the database's EXPLAIN QUERY PLAN output. Requests above
+REQUEST_THRESHOLD_MS are logged on the 'schemas.slow_queries' logger.
+
+The log is disabled by default and configured with SCHEMAS_SLOW_QUERY_LOG.
+"""
+import hashlib
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'QUERY_THRESHOLD_MS': 100,
+    'REQUEST_THRESHOLD_MS': 500,
+    'EXPLAIN': True,
+    'MAX_ENTRIES': 10000,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SCHEMAS_SLOW_QUERY_LOG', {})}
+
+
+def normalize_sql(sql):
+    """
+    Replaces literals and placeholders so queries that only differ by their
+    values, or by how many values they list, normalise the same. Accepts
+    SQL with placeholders or with the values interpolated
+    """
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'"s\d+_x\d+"', '"savepoint"', sql)
+    sql = re.sub(r'%s|\b\d+(\.\d+)?\b', '?', sql)
+    sql = re.sub(r'IN \([?, ]+\)', 'IN (...)', sql)
+    # Multi-row inserts and bulk updates normalise like a single row
+    sql = re.sub(
+        r'(?: UNION ALL SELECT (?:\?|NULL)(?:, (?:\?|NULL))*)+',
+        ' UNION ALL ...', sql
+    )
+    return re.sub(
+        r'(?:WHEN \([^()]*\) THEN (?:CAST\(\? AS \w+\)|\?) )+',
+        'WHEN ... ', sql
+    )
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()
+
+
+def _json_params(params):
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        params = params.values()
+    return [
+        param if isinstance(param, (bool, int, float, str, type(None)))
+        else str(param)
+        for param in params
+    ]
+
+
+def explain(alias, sql, params):
+    """
+    Returns the query plan of a read, one line per plan node
+    """
+    connection = connections[alias]
+    prefix = (
+        'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
+class QueryTimer:
+    """
+    execute_wrapper collecting the queries of one request above a threshold
+    """
+
+    def __init__(self, threshold_ms):
+        self.threshold_ms = threshold_ms
+        self.count = 0
+        self.total_ms = 0.0
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.total_ms += duration_ms
+            if duration_ms >= self.threshold_ms:
+                self.slow.append((
+                    context['connection'].alias, sql, params, many,
+                    duration_ms,
+                ))
+
+
+class SlowQueryLogMiddleware:
+    """
+    Records the slow queries and slow requests of the API
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        timer = QueryTimer(config['QUERY_THRESHOLD_MS'])
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        view, action = self.view_action(request)
+        if duration_ms >= config['REQUEST_THRESHOLD_MS']:
+            logger.warning(
+                'Slow request %s %s (%s) took %.1f ms, %d queries took '
+                '%.1f ms', request.method, request.path, action or view,
+                duration_ms, timer.count, timer.total_ms
+            )
+        if timer.slow:
+            self.record(timer.slow, view, action, config)
+        return response
+
+    @staticmethod
+    def view_action(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return '', ''
+        # Viewset routes map HTTP methods to their actions
+        actions = getattr(match.func, 'actions', None) or {}
+        return match.view_name, actions.get(request.method.lower(), '')
+
+    def record(self, queries, view, action, config):
+        entries = []
+        for alias, sql, params, many, duration_ms in queries:
+            normalized = normalize_sql(sql)
+            plan = ''
+            if (config['EXPLAIN'] and not many
+                    and normalized.upper().startswith('SELECT')):
+                try:
+                    plan = explain(alias, sql, params)
+                except Exception as e:
+                    plan = f'EXPLAIN failed: {e}'
+            entries.append(SlowQuery(
+                fingerprint=fingerprint(normalized),
+                sql=normalized,
+                params=[] if many else _json_params(params),
+                duration_ms=round(duration_ms, 3),
+                database=alias,
+                view=view,
+                action=action,
+                plan=plan,
+            ))
+        SlowQuery.objects.bulk_create(entries)
+        SlowQuery.objects.trim(config['MAX_ENTRIES'])
@@ -0,0 +1,525 @@
+"""
+Compact binary snapshots of the simulated tables.
+
+A snapshot is a gzip stream holding a magic string, a JSON header with the
+columns of every block (tables, attributes, table relations and the
+dictionaries of encoded columns) and then
+chunks of rows stored column by column:
+
+    chunk:   block index (uint8), row count (uint32), one column block
+             per column of the block, a block index of 255 ends the file
+    column:  null mask (one byte per row) followed by
+             int       int64 per row
+             bool      one byte per row
+             datetime  int64 microseconds since the epoch, UTC
+             str       uint32 byte length per row, then the UTF-8 bytes
+
+All numbers are little-endian. Restoring bulk-inserts every chunk with the
+attribute indexes dropped and rebuilds them once the data is loaded, codes of
+dictionary encoded attributes are remapped to the restored shard's
+dictionary.
+"""
+import gzip
+import json
+import struct
+import sys
+from array import array
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import (
+    Table,
+    Attribute,
+    ChangeEvent,
+    ColumnStatistics,
+    DictionaryEntry,
+    ShardMap,
+    ATTR_TYPE_PARSERS,
+)
+from .sharding import get_shards
+
+MAGIC = b'SCHSNAP1'
+END_OF_SNAPSHOT = 255
+CHUNK_SIZE = 10000
+
+# Parses restored attr_values into the values the API receives, which sends
+# datetimes as strings
+PAYLOAD_PARSERS = {**ATTR_TYPE_PARSERS, 'datetime': str}
+
+BLOCKS = (
+    ('tables', (
+        ('id', 'int'),
+        ('name', 'str'),
+        ('active', 'bool'),
+        ('created_at', 'datetime'),
+        ('updated_at', 'datetime'),
+        ('database', 'str'),
+    )),
+    ('attributes', (
+        ('table_id', 'int'),
+        ('name', 'str'),
+        ('attr_type', 'str'),
+        ('attr_value', 'str'),
+        ('unique', 'bool'),
+        ('required', 'bool'),
+        ('encoding', 'str'),
+        ('active', 'bool'),
+        ('created_at', 'datetime'),
+        ('updated_at', 'datetime'),
+    )),
+    ('relations', (
+        ('from_table_id', 'int'),
+        ('to_table_id', 'int'),
+    )),
+    ('dictionary', (
+        ('name', 'str'),
+        ('code', 'int'),
+        ('value', 'str'),
+        ('database', 'str'),
+    )),
+)
+BLOCK_INDEX = {name: index for index, (name, _) in enumerate(BLOCKS)}
+BLOCK_COLUMNS = dict(BLOCKS)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _to_little_endian(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _to_microseconds(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return (value - EPOCH) // MICROSECOND
+
+
+def _from_microseconds(value):
+    moment = EPOCH + timedelta(microseconds=value)
+    if not settings.USE_TZ:
+        return timezone.make_naive(moment, dt_timezone.utc)
+    return moment
+
+
+def encode_column(column_type, values):
+    mask = bytes(value is None for value in values)
+    if column_type == 'int':
+        payload = _to_little_endian(
+            array('q', (value or 0 for value in values))
+        )
+    elif column_type == 'bool':
+        payload = bytes(bool(value) for value in values)
+    elif column_type == 'datetime':
+        payload = _to_little_endian(array('q', (
+            0 if value is None else _to_microseconds(value)
+            for value in values
+        )))
+    else:
+        encoded = [
+            b'' if value is None else value.encode() for value in values
+        ]
+        lengths = array('I', (len(value) for value in encoded))
+        payload = _to_little_endian(lengths) + b''.join(encoded)
+    return mask + payload
+
+
+def _read(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise SnapshotError('Snapshot is truncated')
+    return data
+
+
+def decode_column(stream, column_type, rows):
+    mask = _read(stream, rows)
+    if column_type == 'int':
+        values = list(_from_little_endian('q', _read(stream, rows * 8)))
+    elif column_type == 'bool':
+        values = [bool(value) for value in _read(stream, rows)]
+    elif column_type == 'datetime':
+        values = [
+            _from_microseconds(value)
+            for value in _from_little_endian('q', _read(stream, rows * 8))
+        ]
+    else:
+        lengths = _from_little_endian('I', _read(stream, rows * 4))
+        blob = _read(stream, sum(lengths))
+        values = []
+        offset = 0
+        for length in lengths:
+            values.append(blob[offset:offset + length].decode())
+            offset += length
+    return [
+        None if is_null else value for is_null, value in zip(mask, values)
+    ]
+
+
+def _chunks(rows):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _write_chunk(stream, block, rows):
+    columns = BLOCK_COLUMNS[block]
+    stream.write(struct.pack('<BI', BLOCK_INDEX[block], len(rows)))
+    for position, (_, column_type) in enumerate(columns):
+        stream.write(
+            encode_column(column_type, [row[position] for row in rows])
+        )
+
+
+def _snapshot_rows(database):
+    """
+    Yields (block, rows) for everything stored on a shard
+    """
+    tables = Table.objects.using(database).order_by('id').values_list(
+        'id', 'name', 'active', 'created_at', 'updated_at'
+    )
+    yield 'tables', (row + (database, ) for row in tables.iterator())
+
+    # The dictionary goes first so restores can remap codes as they load
+    # the attributes
+    dictionary = DictionaryEntry.objects.using(database).order_by(
+        'id'
+    ).values_list('name', 'code', 'value')
+    yield 'dictionary', (row + (database, ) for row in dictionary.iterator())
+
+    attributes = Attribute.objects.using(database).order_by('id').values_list(
+        *(name for name, _ in BLOCK_COLUMNS['attributes'])
+    )
+    yield 'attributes', attributes.iterator()
+
+    relations = Table.related_tables.through.objects.using(
+        database
+    ).order_by('id').values_list('from_table_id', 'to_table_id')
+    yield 'relations', relations.iterator()
+
+
+def write_snapshot(path, databases=None):
+    """
+    Writes the tables of every shard to path, returns the rows per block
+    """
+    counts = {name: 0 for name, _ in BLOCKS}
+    header = json.dumps({
+        'version': 2,
+        'blocks': [
+            {'name': name, 'columns': [list(column) for column in columns]}
+            for name, columns in BLOCKS
+        ],
+    }).encode()
+    with gzip.open(path, 'wb') as stream:
+        stream.write(MAGIC)
+        stream.write(struct.pack('<I', len(header)))
+        stream.write(header)
+        for database in databases or get_shards():
+            for block, rows in _snapshot_rows(database):
+                for chunk in _chunks(rows):
+                    _write_chunk(stream, block, chunk)
+                    counts[block] += len(chunk)
+        stream.write(struct.pack('<BI', END_OF_SNAPSHOT, 0))
+    return counts
+
+
+def read_snapshot(path):
+    """
+    Yields (block, rows) chunks of a snapshot, rows are dicts by column
+    """
+    with gzip.open(path, 'rb') as stream:
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise SnapshotError(f'{path} is not a table snapshot')
+        header_size, = struct.unpack('<I', _read(stream, 4))
+        header = json.loads(_read(stream, header_size))
+        blocks = [
+            (block['name'], block['columns']) for block in header['blocks']
+        ]
+        while True:
+            index, rows = struct.unpack('<BI', _read(stream, 5))
+            if index == END_OF_SNAPSHOT:
+                return
+            name, columns = blocks[index]
+            values = [
+                decode_column(stream, column_type, rows)
+                for _, column_type in columns
+            ]
+            yield name, [dict(zip(
+                (column for column, _ in columns), row
+            )) for row in zip(*values)]
+
+
+class BulkLoader:
+    """
+    Inserts rows of one model on one database with executemany
+    """
+
+    def __init__(self, model, database, columns):
+        self.connection = connections[database]
+        self.fields = [model._meta.get_field(column) for column in columns]
+        quote = self.connection.ops.quote_name
+        self.sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in self.fields),
+            ', '.join(['%s'] * len(self.fields)),
+        )
+
+    def load(self, rows):
+        # Columns missing from older snapshots get the field default
+        values = [
+            [
+                field.get_db_prep_save(
+                    row[field.attname] if field.attname in row
+                    else field.get_default(),
+                    self.connection
+                )
+                for field in self.fields
+            ]
+            for row in rows
+        ]
+        with self.connection.cursor() as cursor:
+            cursor.executemany(self.sql, values)
+
+
+class DeferredIndexes:
+    """
+    Drops the Meta.indexes of a model on every database while a bulk load
+    runs and rebuilds them afterwards
+    """
+
+    def __init__(self, model, databases):
+        self.model = model
+        self.databases = databases
+
+    def _editors(self):
+        # The editors are not entered: on SQLite that would disable foreign
+        # key checks, which cannot happen inside the restore transaction,
+        # and index DDL doesn't need it.
+        return [
+            connections[database].schema_editor()
+            for database in self.databases
+        ]
+
+    def __enter__(self):
+        for editor in self._editors():
+            for index in self.model._meta.indexes:
+                editor.remove_index(self.model, index)
+
+    def __exit__(self, *exc_info):
+        for editor in self._editors():
+            for index in self.model._meta.indexes:
+                editor.add_index(self.model, index)
+
+
+class SnapshotRestore:
+    """
+    Loads a snapshot into the shards it was taken from, tables of shards
+    that are no longer configured go to 'default'
+    """
+    BLOCK_MODELS = {
+        'tables': (
+            Table,
+            ('id', 'name', 'active', 'created_at', 'updated_at'),
+        ),
+        'attributes': (
+            Attribute,
+            [column for column, _ in BLOCK_COLUMNS['attributes']],
+        ),
+        'relations': (
+            Table.related_tables.through,
+            ('from_table_id', 'to_table_id'),
+        ),
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self.shards = get_shards()
+        self.table_databases = {}
+        self.table_sources = {}
+        self.table_names = {}
+        self.table_fields = {}
+        self.table_values = {}
+        # (snapshot database, name, code) -> code on the restored shard
+        self.codes = {}
+        self.decoded = {}
+        self.loaders = {}
+        self.counts = {name: 0 for name, _ in BLOCKS}
+
+    def loader(self, block, database):
+        if (block, database) not in self.loaders:
+            model, columns = self.BLOCK_MODELS[block]
+            self.loaders[block, database] = BulkLoader(
+                model, database, columns
+            )
+        return self.loaders[block, database]
+
+    def restore(self):
+        with ExitStack() as stack:
+            for database in {DEFAULT_DB_ALIAS, *self.shards}:
+                stack.enter_context(transaction.atomic(using=database))
+            # Inside the transactions, so a failed restore rolls the dropped
+            # indexes back with the data
+            stack.enter_context(DeferredIndexes(Attribute, self.shards))
+            for block, rows in read_snapshot(self.path):
+                if block == 'tables':
+                    self.load_tables(rows)
+                elif block == 'dictionary':
+                    self.load_dictionary(rows)
+                else:
+                    self.load_table_rows(block, rows)
+                self.counts[block] += len(rows)
+            self.record_changes()
+
+        for database in set(self.table_databases.values()):
+            ColumnStatistics.objects.db_manager(database).analyze()
+        return self.counts
+
+    def load_tables(self, rows):
+        by_database = {}
+        for row in rows:
+            database = self.shard_of(row)
+            self.table_databases[row['id']] = database
+            self.table_sources[row['id']] = row['database']
+            self.table_names[row['id']] = row['name']
+            by_database.setdefault(database, []).append(row)
+
+        self.check_free([row['id'] for row in rows])
+        for database, table_rows in by_database.items():
+            table_ids = [row['id'] for row in table_rows]
+            self.loader('tables', database).load(table_rows)
+            ShardMap.objects.bulk_create(
+                ShardMap(table_id=table_id, database=database)
+                for table_id in table_ids
+            )
+
+    def check_free(self, table_ids):
+        """
+        Refuses ids that are mapped, or used on any shard, so a restore
+        never hides an existing table
+        """
+        existing = ShardMap.objects.filter(
+            table_id__in=table_ids
+        ).values_list('table_id', 'database').first()
+        if existing is not None:
+            raise SnapshotError(
+                f'Table {existing[0]} already exists on {existing[1]}'
+            )
+        for database in self.shards:
+            existing = Table.objects.using(database).filter(
+                pk__in=table_ids
+            ).values_list('pk', flat=True).first()
+            if existing is not None:
+                raise SnapshotError(
+                    f'Table {existing} already exists on {database}'
+                )
+
+    def shard_of(self, row):
+        if row['database'] in self.shards:
+            return row['database']
+        return DEFAULT_DB_ALIAS
+
+    def load_dictionary(self, rows):
+        """
+        Adds the values to the dictionaries of the restored shards, which
+        may already hold other codes
+        """
+        by_column = {}
+        for row in rows:
+            by_column.setdefault(
+                (self.shard_of(row), row['name']), []
+            ).append(row)
+        for (database, name), entries in by_column.items():
+            codes = DictionaryEntry.objects.db_manager(database).encode(
+                name, [entry['value'] for entry in entries]
+            )
+            for entry in entries:
+                key = (entry['database'], name, str(entry['code']))
+                self.codes[key] = codes[entry['value']]
+                self.decoded[key] = entry['value']
+
+    def recode(self, row):
+        """
+        Remaps the code of the row, returns the value it encodes
+        """
+        key = (self.table_sources[row['table_id']], row['name'],
+               row['attr_value'])
+        if key not in self.codes:
+            raise SnapshotError(
+                f"No dictionary entry for code {row['attr_value']} of "
+                f"{row['name']}"
+            )
+        row['attr_value'] = self.codes[key]
+        return self.decoded[key]
+
+    def collect_change(self, row, value):
+        table_id = row['table_id']
+        self.table_fields.setdefault(table_id, []).append({
+            'name': row['name'],
+            'attr_type': row['attr_type'],
+            'unique': row.get('unique', False),
+            'required': row.get('required', False),
+        })
+        if value:
+            parser = PAYLOAD_PARSERS.get(row['attr_type'], str)
+            self.table_values.setdefault(table_id, {})[row['name']] = (
+                parser(value)
+            )
+
+    def load_table_rows(self, block, rows):
+        key = 'table_id' if block == 'attributes' else 'from_table_id'
+        by_database = {}
+        for row in rows:
+            if block == 'attributes':
+                value = row['attr_value']
+                if row.get('encoding') == Attribute.DICTIONARY and value:
+                    value = self.recode(row)
+                self.collect_change(row, value)
+            database = self.table_databases[row[key]]
+            by_database.setdefault(database, []).append(row)
+        for database, block_rows in by_database.items():
+            self.loader(block, database).load(block_rows)
+
+    def record_changes(self):
+        """
+        Records the restored tables in the change feed, as if they were
+        created and filled through the API
+        """
+        events = []
+        for table_id in sorted(self.table_databases):
+            events.append((ChangeEvent.TABLE_CREATE, table_id, {
+                'name': self.table_names[table_id],
+                'fields': self.table_fields.get(table_id, []),
+            }))
+            if table_id in self.table_values:
+                events.append((ChangeEvent.ROW_INSERT, table_id, {
+                    'values': self.table_values[table_id],
+                }))
+        ChangeEvent.objects.record_many(events)
+
+
+def restore_snapshot(path):
+    """
+    Restores a snapshot, returns the rows loaded per block
+    """
+    return SnapshotRestore(path).restore()
@@ -1,14 +1,38 @@
-from datetime import datetime
+import difflib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from io import StringIO
 from rest_framework.test import APITestCase
 from rest_framework import status
-from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from django.core.management import call_command, CommandError
+from django.db import connection, connections, router
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, NoReverseMatch
+from django.utils import timezone
 
-from schemas.models import Table, Attribute
+from schemas.models import (
+    Table,
+    Attribute,
+    ChangeEvent,
+    ColumnStatistics,
+    DictionaryEntry,
+    ShardMap,
+    SlowQuery,
+)
 from schemas.serializers import (
+    AttributeSerializer,
     TableSerializer,
     TableSchemaSerializer,
 )
+from schemas.admission import get_controller
+from schemas.db_routers import use_primary
 from schemas.factories import TableFactory, AttributeFactory
+from schemas.slow_queries import fingerprint, normalize_sql
 
 
 class TableTests(APITestCase):
@@ -164,6 +188,7 @@ class AttributeTests(APITestCase):
     # Test attribute type creation fail 403
     # Test add attribute value to table success
     # Test add attribute value to table fail
+    # Test add unknown attribute to table fail
     """
 
     def setUp(self):
@@ -303,3 +328,1219 @@ class AttributeTests(APITestCase):
         self.assertIsNone(
             Attribute.objects.get(name=self.dummy_required_field.name).value
         )
+
+    def test_attribute_set_unknown_attribute_fail(self):
+        url = reverse('table-insert-data', kwargs={'pk': self.dummy_table.id})
+        data = {self.dummy_int_field.name: 5, 'not_an_attribute': 1}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(
+            Attribute.objects.get(name=self.dummy_int_field.name).value
+        )
+
+
+class TableRenderTests(APITestCase):
+    """
+    # Test rendered tables are byte compatible with AttributeSerializer
+    # Test rendering a page of tables runs a single attribute query
+    """
+
+    def setUp(self):
+        self.tables = TableFactory.create_batch(3)
+        for attr_type, value in (
+            ('str', 'Inception'),
+            ('int', 148),
+            ('float', 8.8),
+            ('bool', True),
+            ('datetime', '16/07/2010'),
+        ):
+            AttributeFactory(
+                table=self.tables[0],
+                attr_type=attr_type,
+                name=f'{attr_type}_field',
+                value=value
+            )
+        AttributeFactory(
+            table=self.tables[1], name='name', attr_type='str',
+            value='shadowed'
+        )
+        AttributeFactory(table=self.tables[1], name='empty', attr_type='int')
+
+    def serialize_with_attributes(self, table):
+        data = {
+            attr['name']: attr['value'] for attr in (
+                AttributeSerializer(attr).data
+                for attr in table.table_attrs.all()
+            )
+        }
+        data['name'] = table.name
+        return data
+
+    def test_render_matches_attribute_serializer(self):
+        renderer = JSONRenderer()
+        for table in self.tables:
+            self.assertEqual(
+                renderer.render(TableSerializer(table).data),
+                renderer.render(self.serialize_with_attributes(table))
+            )
+
+    def test_render_many_single_query(self):
+        with self.assertNumQueries(1):
+            data = TableSerializer(self.tables, many=True).data
+        self.assertEqual(
+            data,
+            [self.serialize_with_attributes(table) for table in self.tables]
+        )
+
+
+class ColumnStatisticsTests(APITestCase):
+    """
+    # Test analyze collects column statistics
+    # Test writes mark statistics as stale
+    # Test planner orders filters by selectivity
+    # Test planner keeps filters outside the analyzed range
+    # Test filters matching most of a column return every table
+    # Test explain returns the plan
+    # Test explain=0 lists the tables
+    """
+
+    def setUp(self):
+        self.tables = TableFactory.create_batch(6)
+        for index, table in enumerate(self.tables):
+            AttributeFactory(
+                table=table,
+                name='genre',
+                attr_type='str',
+                value='drama' if index else 'comedy'
+            )
+            AttributeFactory(
+                table=table,
+                name='rating',
+                attr_type='int',
+                value=index + 1
+            )
+        AttributeFactory(table=self.tables[0], name='tagline', attr_type='str')
+        call_command('analyze_tables', stdout=StringIO())
+
+    def test_analyze_collects_statistics(self):
+        genre = ColumnStatistics.objects.get(name='genre')
+        self.assertEqual(genre.row_count, 6)
+        self.assertEqual(genre.distinct_count, 2)
+        self.assertEqual(genre.histogram, [['drama', 5], ['comedy', 1]])
+        rating = ColumnStatistics.objects.get(name='rating')
+        self.assertEqual((rating.min_value, rating.max_value), ('1', '6'))
+        tagline = ColumnStatistics.objects.get(name='tagline')
+        self.assertEqual(tagline.null_fraction, 1.0)
+
+    def test_insert_data_marks_statistics_stale(self):
+        url = reverse('table-insert-data', kwargs={'pk': self.tables[0].id})
+        self.client.post(url, {'genre': 'horror'}, format='json')
+        self.client.post(url, {'genre': 'comedy'}, format='json')
+        self.assertTrue(ColumnStatistics.objects.get(name='genre').is_stale)
+        self.assertFalse(ColumnStatistics.objects.get(name='rating').is_stale)
+
+    def test_plan_orders_by_selectivity(self):
+        plan = Table.objects.plan_filter({'genre': 'drama', 'rating': '2'})
+        self.assertEqual(
+            [step.name for step in plan.steps], ['rating', 'genre']
+        )
+        self.assertEqual(
+            [step.estimated_rows for step in plan.steps], [1, 5]
+        )
+
+    def test_plan_keeps_out_of_range(self):
+        plan = Table.objects.plan_filter({'rating': '42', 'genre': 'horror'})
+        self.assertEqual(
+            [step.name for step in plan.steps], ['rating', 'genre']
+        )
+        self.assertEqual(plan.estimated_rows, 0)
+
+    def test_filter_value_written_after_analyze(self):
+        url = reverse('table-insert-data', kwargs={'pk': self.tables[0].id})
+        self.client.post(url, {'rating': 42}, format='json')
+        self.assertFalse(ColumnStatistics.objects.get(name='rating').is_stale)
+        response = self.client.get(reverse('table-list') + '?rating=42')
+        self.assertEqual(response.data['count'], 1)
+
+    def test_filter_matching_most_of_column(self):
+        tables = Table.objects.filter_by_attr(
+            {'genre': 'drama', 'rating': '2'}
+        )
+        expected = [self.tables[1], self.tables[1]] + self.tables[2:]
+        self.assertEqual(
+            [table.pk for table in tables],
+            [table.pk for table in expected]
+        )
+
+    def test_list_explain(self):
+        url = reverse('table-list') + '?rating=3&explain=1'
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['plan']['steps'], [{
+            'name': 'rating',
+            'value': '3',
+            'estimated_rows': 1.0,
+            'selectivity': 0.1667,
+        }])
+
+    def test_list_explain_disabled(self):
+        url = reverse('table-list') + '?rating=3&explain=0'
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('plan', response.data)
+        self.assertEqual(response.data['count'], 1)
+
+
+class AdmissionTests(APITestCase):
+    """
+    # Test overloaded endpoint class sheds with 503
+    # Test overloaded table sheds with 429
+    # Test shed requests do not block other endpoint classes
+    # Test admission metrics
+    # Test slots are released when the view fails
+    # Test change feed long-polls are capped
+    """
+    admission = {
+        'ENDPOINTS': {
+            'scan': {'CONCURRENCY': 1, 'QUEUE': 0, 'TIMEOUT': 0},
+            'changes': {'CONCURRENCY': 1, 'QUEUE': 0, 'TIMEOUT': 0},
+        },
+        'TABLE': {'CONCURRENCY': 1, 'QUEUE': 0, 'TIMEOUT': 0},
+        'RETRY_AFTER': 3,
+    }
+
+    def setUp(self):
+        self.table = TableFactory()
+
+    def test_overloaded_endpoint_sheds(self):
+        with self.settings(SCHEMAS_ADMISSION=self.admission):
+            release = get_controller().admit('scan')
+            response = self.client.get(reverse('table-list'), format='json')
+            release()
+            self.assertEqual(
+                response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            self.assertEqual(response['Retry-After'], '3')
+
+            url = reverse('table-detail', kwargs={'pk': self.table.id})
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_overloaded_table_sheds(self):
+        with self.settings(SCHEMAS_ADMISSION=self.admission):
+            release = get_controller().admit('lookup', str(self.table.id))
+            url = reverse('table-detail', kwargs={'pk': self.table.id})
+            response = self.client.get(url, format='json')
+            release()
+            self.assertEqual(
+                response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            self.assertEqual(response['Retry-After'], '3')
+
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_admission_metrics(self):
+        with self.settings(SCHEMAS_ADMISSION=self.admission):
+            release = get_controller().admit('scan')
+            self.client.get(reverse('table-list'), format='json')
+            response = self.client.get(
+                reverse('admission-list'), format='json'
+            )
+            release()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['endpoints']['scan']['in_flight'], 1)
+        self.assertEqual(response.data['endpoints']['scan']['shed'], 1)
+        self.assertEqual(response.data['tables']['active'], 0)
+
+    def test_failed_request_releases_slots(self):
+        url = reverse('table-insert-data', kwargs={'pk': self.table.id})
+        with self.settings(SCHEMAS_ADMISSION=self.admission):
+            with self.assertRaises(AttributeError):
+                self.client.post(url, ['title'], format='json')
+            metrics = get_controller().metrics()
+            self.assertEqual(metrics['endpoints']['write']['in_flight'], 0)
+            self.assertEqual(metrics['tables']['active'], 0)
+            response = self.client.post(url, {}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(SCHEMAS_CHANGES={'LONG_POLL_TIMEOUT': 0})
+    def test_long_polls_are_capped(self):
+        with self.settings(SCHEMAS_ADMISSION=self.admission):
+            release = get_controller().admit('changes')
+            response = self.client.get(reverse('changes-list'), format='json')
+            release()
+            self.assertEqual(
+                response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            self.assertEqual(
+                get_controller().metrics()['endpoints']['changes']['shed'], 1
+            )
+
+            response = self.client.get(reverse('changes-list'), format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(APITestCase):
+    """
+    # Test reads are routed to replicas and writes to the primary
+    # Test reads of a writing request stay on the primary
+    # Test clients read their own writes after writing
+    """
+    databases = {'default', 'replica'}
+
+    def test_router_sends_reads_to_replicas(self):
+        self.assertEqual(Table.objects.all().db, 'replica')
+        self.assertEqual(router.db_for_write(Table), 'default')
+        with use_primary():
+            self.assertEqual(Table.objects.all().db, 'default')
+
+    def test_list_reads_from_replica(self):
+        TableFactory.create_batch(2)
+        Table.objects.using('replica').create(name='replicated')
+        response = self.client.get(reverse('table-list'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [table['name'] for table in response.data['results']],
+            ['replicated']
+        )
+
+    def test_read_your_writes(self):
+        url = reverse('table-list')
+        response = self.client.post(
+            url, {'name': 'movies', 'fields': []}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('schemas_use_primary', response.cookies)
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data['count'], 1)
+
+        self.client.cookies.clear()
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data['count'], 0)
+
+
+@override_settings(SCHEMAS_SHARDS=['default', 'shard1'])
+class ShardingTests(APITestCase):
+    """
+    # Test tables are placed across shards
+    # Test detail actions are routed to the owning shard
+    # Test list merges and paginates every shard
+    # Test filters are scattered to every shard
+    # Test filtered lists are merged in the unfiltered list order
+    # Test delete removes the shard map entry
+    # Test ids of dropped tables are not reused
+    # Test rebalance moves a table to another shard
+    """
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        self.table_ids = []
+        for title in ('Alien', 'Brazil', 'Casablanca', 'Dune'):
+            response = self.client.post(reverse('table-list'), {
+                'name': title,
+                'fields': [{'name': 'title', 'attr_type': 'str'}],
+            }, format='json')
+            table_id = ShardMap.objects.latest('table_id').table_id
+            self.table_ids.append(table_id)
+            url = reverse('table-insert-data', kwargs={'pk': table_id})
+            self.client.post(url, {'title': title}, format='json')
+
+    def test_tables_placed_across_shards(self):
+        self.assertEqual(Table.objects.using('default').count(), 2)
+        self.assertEqual(Table.objects.using('shard1').count(), 2)
+        self.assertEqual(len(set(self.table_ids)), 4)
+
+    def test_detail_routed_to_shard(self):
+        for table_id in self.table_ids:
+            url = reverse('table-detail', kwargs={'pk': table_id})
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['title'], response.data['name'])
+
+            url = reverse('table-get-schema', kwargs={'pk': table_id})
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.data['fields'][0]['name'], 'title')
+
+    def test_list_merges_shards(self):
+        url = reverse('table-list') + '?limit=2&offset=1'
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(
+            [table['name'] for table in response.data['results']],
+            ['Brazil', 'Casablanca']
+        )
+
+    def test_filter_scattered_to_shards(self):
+        url = reverse('table-list') + '?title=Dune'
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['name'], 'Dune')
+
+    def test_filter_merges_shards_in_list_order(self):
+        for table_id in self.table_ids:
+            Table.objects.on_shard_of(table_id).insert_data(
+                table_id, {'title': 'Film'}
+            )
+        url = reverse('table-list') + '?title=Film&limit=3'
+        response = self.client.get(url, format='json')
+        self.assertEqual(
+            [table['name'] for table in response.data['results']],
+            ['Alien', 'Brazil', 'Casablanca']
+        )
+
+    def test_delete_removes_shard_map_entry(self):
+        shard1_id = ShardMap.objects.filter(database='shard1').first().pk
+        url = reverse('table-detail', kwargs={'pk': shard1_id})
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ShardMap.objects.filter(table_id=shard1_id).exists())
+        self.assertEqual(Table.objects.using('shard1').count(), 1)
+
+    def test_dropped_table_ids_not_reused(self):
+        last_id = max(self.table_ids)
+        self.client.delete(reverse('table-detail', kwargs={'pk': last_id}))
+        Table.objects.create_table_with_attributes('Eraserhead', [])
+        self.assertEqual(
+            ShardMap.objects.latest('table_id').table_id, last_id + 1
+        )
+
+    def test_rebalance_table(self):
+        table_id = ShardMap.objects.filter(database='shard1').first().pk
+        original = Table.objects.using('shard1').get(pk=table_id)
+        call_command(
+            'rebalance_table', table_id, '--to', 'default', stdout=StringIO()
+        )
+        self.assertEqual(ShardMap.objects.database_for(table_id), 'default')
+        moved = Table.objects.using('default').get(pk=table_id)
+        self.assertEqual(moved.created_at, original.created_at)
+        self.assertEqual(moved.table_attrs.get().value, original.name)
+        self.assertFalse(
+            Table.objects.using('shard1').filter(pk=table_id).exists()
+        )
+
+
+@override_settings(SCHEMAS_CHANGES={'LONG_POLL_TIMEOUT': 0, 'BATCH_SIZE': 3})
+class ChangeFeedTests(APITestCase):
+    """
+    # Test every table change is recorded in order
+    # Test changes are read in batches from a sequence number
+    # Test compaction merges row changes and drops dropped tables
+    # Test compacted sequence numbers can still be read
+    # Test reading from purged sequence numbers is gone
+    """
+
+    def setUp(self):
+        response = self.client.post(reverse('table-list'), {
+            'name': 'movies',
+            'fields': [
+                {'name': 'title', 'attr_type': 'str'},
+                {'name': 'rating', 'attr_type': 'float'},
+            ],
+        }, format='json')
+        self.table_id = ChangeEvent.objects.get().table_id
+        url = reverse('table-insert-data', kwargs={'pk': self.table_id})
+        self.client.post(url, {'title': 'Alien'}, format='json')
+        self.client.post(url, {'rating': 8.5}, format='json')
+        url = reverse('table-detail', kwargs={'pk': self.table_id})
+        self.client.patch(url, {'name': 'films'}, format='json')
+
+    def read_changes(self, since):
+        url = reverse('changes-list') + f'?since={since}'
+        return self.client.get(url, format='json')
+
+    def test_changes_recorded(self):
+        self.client.delete(
+            reverse('table-detail', kwargs={'pk': self.table_id})
+        )
+        self.assertEqual(
+            list(ChangeEvent.objects.values_list('kind', flat=True)),
+            ['table_create', 'row_insert', 'row_update', 'schema_change',
+             'table_drop']
+        )
+        self.assertEqual(
+            ChangeEvent.objects.get(kind='row_update').payload,
+            {'values': {'rating': 8.5}}
+        )
+
+    def test_changes_read_in_batches(self):
+        response = self.read_changes(0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertTrue(response.data['more'])
+
+        response = self.read_changes(response.data['next'])
+        self.assertEqual(
+            [event['kind'] for event in response.data['results']],
+            ['schema_change']
+        )
+        self.assertFalse(response.data['more'])
+
+        response = self.read_changes(response.data['next'])
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['next'], response.data['since'])
+
+    def test_compaction(self):
+        horizon = timezone.now() + timedelta(seconds=1)
+        self.assertEqual(ChangeEvent.objects.compact(horizon), 1)
+        row = ChangeEvent.objects.get(
+            table_id=self.table_id, kind='row_insert'
+        )
+        self.assertEqual(
+            row.payload, {'values': {'title': 'Alien', 'rating': 8.5}}
+        )
+
+        self.client.delete(
+            reverse('table-detail', kwargs={'pk': self.table_id})
+        )
+        horizon = timezone.now() + timedelta(seconds=1)
+        ChangeEvent.objects.compact(horizon)
+        self.assertEqual(
+            list(ChangeEvent.objects.values_list('kind', flat=True)),
+            ['table_drop']
+        )
+
+    def test_compacted_changes_are_not_gone(self):
+        self.client.delete(
+            reverse('table-detail', kwargs={'pk': self.table_id})
+        )
+        horizon = timezone.now() + timedelta(seconds=1)
+        ChangeEvent.objects.compact(horizon)
+        response = self.read_changes(0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [event['kind'] for event in response.data['results']],
+            ['table_drop']
+        )
+        self.assertEqual(response.data['head'], response.data['next'])
+
+    def test_purged_changes_are_gone(self):
+        ChangeEvent.objects.purge(max_age=timedelta(days=1), max_events=2)
+        last_seq = ChangeEvent.objects.last().seq
+        response = self.read_changes(0)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.data['head'], last_seq)
+        self.assertEqual(
+            self.read_changes(last_seq - 2).status_code, status.HTTP_200_OK
+        )
+        ChangeEvent.objects.purge(max_age=timedelta(0), max_events=2)
+        self.assertEqual(ChangeEvent.objects.count(), 0)
+        self.assertEqual(ChangeEvent.objects.head(), last_seq)
+        self.assertEqual(
+            self.read_changes(last_seq - 1).status_code, status.HTTP_410_GONE
+        )
+
+
+@override_settings(SCHEMAS_SHARDS=['default', 'shard1'])
+class SnapshotTests(APITestCase):
+    """
+    # Test snapshot and restore round trip every table
+    # Test restore fails on existing tables
+    # Test restore fails on tables existing on another shard
+    # Test restore keeps the attribute indexes
+    # Test restore records the tables in the change feed
+    """
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        for title in ('Alien', 'Brazil', 'Casablanca'):
+            Table.objects.create_table_with_attributes(title, [
+                {'name': 'title', 'attr_type': 'str', 'required': True},
+                {'name': 'release_date', 'attr_type': 'datetime'},
+            ])
+        for shard in Table.objects.shards():
+            for table in shard.all():
+                shard.insert_data(table.pk, {
+                    'title': table.name, 'release_date': '25/05/1979'
+                })
+        handle, self.path = tempfile.mkstemp(suffix='.snapshot')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def dump_tables(self):
+        tables = []
+        for database in ('default', 'shard1'):
+            for table in Table.objects.using(database).order_by('id'):
+                tables.append((
+                    database, table.pk, table.name, table.created_at,
+                    list(table.table_attrs.order_by('id').values_list(
+                        'name', 'attr_type', 'attr_value', 'required',
+                        'created_at'
+                    ))
+                ))
+        return tables
+
+    def test_snapshot_round_trip(self):
+        before = self.dump_tables()
+        call_command('snapshot_tables', self.path, stdout=StringIO())
+        for database in ('default', 'shard1'):
+            Table.objects.using(database).all().delete()
+        ShardMap.objects.all().delete()
+
+        call_command('restore_tables', self.path, stdout=StringIO())
+        self.assertEqual(self.dump_tables(), before)
+        self.assertEqual(ShardMap.objects.count(), 3)
+        title = ColumnStatistics.objects.using('shard1').get(name='title')
+        self.assertEqual(
+            title.row_count, Table.objects.using('shard1').count()
+        )
+
+    def test_restore_existing_tables_fails(self):
+        call_command('snapshot_tables', self.path, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('restore_tables', self.path, stdout=StringIO())
+        self.assertEqual(Table.objects.using('default').count(), 1)
+
+    def test_restore_table_existing_on_other_shard_fails(self):
+        call_command('snapshot_tables', self.path, stdout=StringIO())
+        shard1_id = Table.objects.using('shard1').values_list(
+            'pk', flat=True
+        ).first()
+        for database in ('default', 'shard1'):
+            Table.objects.using(database).all().delete()
+        ShardMap.objects.all().delete()
+        Table.objects.using('default').create(pk=shard1_id, name='Dune')
+        ShardMap.objects.create(table_id=shard1_id, database='default')
+
+        with self.assertRaises(CommandError):
+            call_command('restore_tables', self.path, stdout=StringIO())
+        self.assertEqual(ShardMap.objects.database_for(shard1_id), 'default')
+        self.assertEqual(
+            Table.objects.using('default').get(pk=shard1_id).name, 'Dune'
+        )
+
+    def test_restore_keeps_indexes(self):
+        call_command('snapshot_tables', self.path, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('restore_tables', self.path, stdout=StringIO())
+        index = Attribute._meta.indexes[0].name
+        for database in ('default', 'shard1'):
+            introspection = connections[database].introspection
+            with connections[database].cursor() as cursor:
+                constraints = introspection.get_constraints(
+                    cursor, Attribute._meta.db_table
+                )
+            self.assertIn(index, constraints)
+
+    def test_restore_records_changes(self):
+        call_command('snapshot_tables', self.path, stdout=StringIO())
+        created = list(ChangeEvent.objects.order_by(
+            'table_id', 'seq'
+        ).values_list('kind', 'table_id', 'payload'))
+        for database in ('default', 'shard1'):
+            Table.objects.using(database).all().delete()
+        ShardMap.objects.all().delete()
+        since = ChangeEvent.objects.head()
+
+        call_command('restore_tables', self.path, stdout=StringIO())
+        restored = list(ChangeEvent.objects.filter(seq__gt=since).order_by(
+            'table_id', 'seq'
+        ).values_list('kind', 'table_id', 'payload'))
+        self.assertEqual(restored, created)
+
+
+class DictionaryEncodingTests(APITestCase):
+    """
+    # Test encoded columns store codes and read back values
+    # Test filters on encoded columns
+    # Test filters on plain columns skip the dictionary
+    # Test filters on columns encoded after analyze
+    # Test encoding is chosen from column statistics
+    # Test unknown encodings are rejected
+    # Test moving a table recodes it for the target shard
+    # Test restoring a snapshot recodes it for the target dictionary
+    """
+    databases = {'default', 'shard1'}
+
+    def create_table(self, genre_field):
+        self.client.post(reverse('table-list'), {
+            'name': 'movies',
+            'fields': [{'name': 'title', 'attr_type': 'str'}, genre_field],
+        }, format='json')
+        return ShardMap.objects.latest('table_id').table_id
+
+    def insert(self, table_id, data):
+        url = reverse('table-insert-data', kwargs={'pk': table_id})
+        return self.client.post(url, data, format='json')
+
+    def setUp(self):
+        self.table_ids = []
+        for title, genre in (('Alien', 'horror'), ('Brazil', 'comedy'),
+                             ('Cube', 'horror')):
+            table_id = self.create_table({
+                'name': 'genre', 'attr_type': 'str', 'encoding': 'dictionary'
+            })
+            self.insert(table_id, {'title': title, 'genre': genre})
+            self.table_ids.append(table_id)
+
+    def test_encoded_values(self):
+        genres = Attribute.objects.filter(name='genre').order_by('id')
+        self.assertEqual(
+            [genre.attr_value for genre in genres], ['1', '2', '1']
+        )
+        self.assertEqual(
+            [genre.value for genre in genres], ['horror', 'comedy', 'horror']
+        )
+        self.assertEqual(DictionaryEntry.objects.count(), 2)
+
+        url = reverse('table-detail', kwargs={'pk': self.table_ids[1]})
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.data, {
+            'title': 'Brazil', 'genre': 'comedy', 'name': 'movies'
+        })
+
+    def test_filter_encoded_column(self):
+        plain_id = self.create_table({'name': 'genre', 'attr_type': 'str'})
+        self.insert(plain_id, {'title': 'Dracula', 'genre': 'horror'})
+        call_command('analyze_tables', stdout=StringIO())
+        for query in ('?genre=horror', '?genre=horror&title=Brazil'):
+            response = self.client.get(reverse('table-list') + query)
+            self.assertEqual(
+                sorted(table['title'] for table in response.data['results']),
+                sorted(['Alien', 'Cube', 'Dracula', 'Brazil'][
+                    :3 if 'title' not in query else 4
+                ])
+            )
+        response = self.client.get(reverse('table-list') + '?genre=1')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_filter_plain_column_skips_dictionary(self):
+        call_command('analyze_tables', stdout=StringIO())
+        with CaptureQueriesContext(connection) as queries:
+            tables = Table.objects.filter_by_attr({'title': 'Cube'})
+        self.assertEqual([table.pk for table in tables], self.table_ids[2:])
+        self.assertFalse(any(
+            DictionaryEntry._meta.db_table in query['sql']
+            for query in queries.captured_queries
+        ))
+
+    def test_filter_column_encoded_after_analyze(self):
+        plain_id = self.create_table({'name': 'mood', 'attr_type': 'str'})
+        self.insert(plain_id, {'title': 'Dracula', 'mood': 'dark'})
+        call_command('analyze_tables', stdout=StringIO())
+        encoded_id = self.create_table({
+            'name': 'mood', 'attr_type': 'str', 'encoding': 'dictionary'
+        })
+        self.insert(encoded_id, {'title': 'Eraserhead', 'mood': 'dark'})
+        response = self.client.get(reverse('table-list') + '?mood=dark')
+        self.assertEqual(
+            [table['title'] for table in response.data['results']],
+            ['Dracula', 'Eraserhead']
+        )
+
+    def test_encoding_from_statistics(self):
+        ColumnStatistics.objects.create(
+            name='genre', attr_type='str', row_count=500, distinct_count=4
+        )
+        table_id = self.create_table({'name': 'genre', 'attr_type': 'str'})
+        genre = Attribute.objects.get(table=table_id, name='genre')
+        self.assertEqual(genre.encoding, Attribute.DICTIONARY)
+        title = Attribute.objects.get(table=table_id, name='title')
+        self.assertEqual(title.encoding, Attribute.PLAIN)
+
+    def test_unknown_encoding_rejected(self):
+        response = self.client.post(reverse('table-list'), {
+            'name': 'movies',
+            'fields': [
+                {'name': 'genre', 'attr_type': 'str', 'encoding': 'rle'}
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_restore_recodes(self):
+        handle, path = tempfile.mkstemp(suffix='.snapshot')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('snapshot_tables', path, stdout=StringIO())
+        Table.objects.all().delete()
+        ShardMap.objects.all().delete()
+        DictionaryEntry.objects.all().delete()
+        DictionaryEntry.objects.create(name='genre', code=1, value='western')
+
+        call_command('restore_tables', path, stdout=StringIO())
+        genres = Attribute.objects.filter(name='genre').order_by('id')
+        self.assertEqual(
+            [genre.value for genre in genres], ['horror', 'comedy', 'horror']
+        )
+        self.assertEqual(
+            DictionaryEntry.objects.decode('genre', ['1']), {'1': 'western'}
+        )
+
+    @override_settings(SCHEMAS_SHARDS=['default', 'shard1'])
+    def test_move_table_recodes(self):
+        Table.objects.move_table(self.table_ids[1], 'shard1')
+        genre = Attribute.objects.using('shard1').get(name='genre')
+        self.assertEqual(genre.attr_value, '1')
+        self.assertEqual(genre.value, 'comedy')
+
+
+class ParallelLoadTests(APITestCase):
+    """
+    # Test csv and jsonl rows are loaded as new tables
+    # Test rejects are reported in input order
+    # Test loading on a pool of workers
+    # Test unknown files and columns fail
+    """
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        self.template = Table.objects.create_table_with_attributes('movies', [
+            {'name': 'title', 'attr_type': 'str', 'required': True},
+            {'name': 'rating', 'attr_type': 'float'},
+            {'name': 'seen', 'attr_type': 'bool'},
+            {'name': 'genre', 'attr_type': 'str', 'encoding': 'dictionary'},
+        ])
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def load(self, *paths, workers=1):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'parallel_load', self.template.pk, *paths, workers=workers,
+            chunk_size=2, stdout=stdout, stderr=stderr
+        )
+        return stdout.getvalue(), stderr.getvalue().splitlines()
+
+    def loaded_rows(self):
+        tables = Table.objects.exclude(pk=self.template.pk).order_by('id')
+        return [TableSerializer(table).data for table in tables]
+
+    def test_load_rows(self):
+        csv_path = self.write_file('.csv', (
+            'title,rating,seen,genre\n'
+            'Alien,8.5,True,horror\n'
+            '"Brazil, the movie",,False,comedy\n'
+        ))
+        jsonl_path = self.write_file('.jsonl', (
+            '{"title": "Cube", "rating": 7.2, "genre": "horror"}\n'
+        ))
+        stdout, stderr = self.load(csv_path, jsonl_path)
+        self.assertIn('Loaded 3 rows, rejected 0', stdout)
+        self.assertEqual(stderr, [])
+        self.assertEqual(self.loaded_rows(), [
+            {'title': 'Alien', 'rating': 8.5, 'seen': True,
+             'genre': 'horror', 'name': 'movies'},
+            {'title': 'Brazil, the movie', 'rating': None, 'seen': False,
+             'genre': 'comedy', 'name': 'movies'},
+            {'title': 'Cube', 'rating': 7.2, 'seen': None,
+             'genre': 'horror', 'name': 'movies'},
+        ])
+        self.assertEqual(
+            DictionaryEntry.objects.filter(name='genre').count(), 2
+        )
+        self.assertEqual(ShardMap.objects.count(), 4)
+        self.assertEqual(
+            ChangeEvent.objects.filter(kind=ChangeEvent.ROW_INSERT).count(), 3
+        )
+
+    def test_rejects_in_input_order(self):
+        path = self.write_file('.csv', (
+            'title,rating\n'
+            ',1.0\n'
+            'Alien,8.5\n'
+            '"Multi\nline",high\n'
+            'Brazil,7.9,extra\n'
+            'Cube,7.2\n'
+        ))
+        stdout, stderr = self.load(path)
+        self.assertIn('Loaded 2 rows, rejected 3', stdout)
+        self.assertEqual(stderr, [
+            f'{path}:2: The attribute title is required',
+            f'{path}:4: Attribute type for rating does not match',
+            f'{path}:6: Expected 2 fields, found 3',
+        ])
+        self.assertEqual(
+            [row['title'] for row in self.loaded_rows()], ['Alien', 'Cube']
+        )
+
+    def test_load_on_workers(self):
+        path = self.write_file('.jsonl', ''.join(
+            f'{{"title": "Movie {row}", "rating": {row}.5}}\n'
+            for row in range(9)
+        ) + '{"title": "Bad", "rating": "high"}\n')
+        stdout, stderr = self.load(path, workers=2)
+        self.assertIn('Loaded 9 rows, rejected 1', stdout)
+        self.assertEqual(
+            stderr, [f'{path}:10: Attribute type for rating does not match']
+        )
+        self.assertEqual(
+            [row['title'] for row in self.loaded_rows()],
+            [f'Movie {row}' for row in range(9)]
+        )
+
+    def test_invalid_input_fails(self):
+        with self.assertRaises(CommandError):
+            self.load(self.write_file('.txt', 'title\nAlien\n'))
+        with self.assertRaises(CommandError):
+            self.load(self.write_file('.csv', 'title,director\nAlien,Scott\n'))
+        self.assertEqual(Table.objects.count(), 1)
+
+
+def format_queries(queries):
+    return '\n'.join(
+        f'{number}. {query["sql"]}' for number, query in enumerate(queries, 1)
+    )
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    # Test every TableViewSet action stays within its query budget
+    # Test query counts don't grow with the number of tables or columns
+    """
+    SIZES = ((1, 2), (10, 2), (25, 8))
+    # Queries allowed per action, whatever the number of tables and columns
+    BUDGETS = {
+        'list': 3,
+        'filter': 5,
+        'retrieve': 3,
+        'get_schema': 3,
+        'create': 13,
+        'insert_data': 7,
+        'partial_update': 5,
+        'update': 5,
+        'destroy': 9,
+    }
+
+    def create_tables(self, tables, columns):
+        fields = [
+            {'name': f'column_{column}', 'attr_type': 'str'}
+            for column in range(columns)
+        ]
+        table_ids = []
+        for row in range(tables):
+            table = Table.objects.create_table_with_attributes(
+                'movies', fields
+            )
+            Table.objects.insert_data(table.pk, {
+                field['name']: f'value {row}' for field in fields
+            })
+            table_ids.append(table.pk)
+        return fields, table_ids
+
+    def requests(self, fields, table_ids):
+        detail = reverse('table-detail', kwargs={'pk': table_ids[0]})
+        return {
+            'list': lambda: self.client.get(reverse('table-list')),
+            'filter': lambda: self.client.get(
+                reverse('table-list') + '?column_0=value+0'
+            ),
+            'retrieve': lambda: self.client.get(detail),
+            'get_schema': lambda: self.client.get(
+                reverse('table-get-schema', kwargs={'pk': table_ids[0]})
+            ),
+            'create': lambda: self.client.post(
+                reverse('table-list'),
+                {'name': 'movies', 'fields': fields}, format='json'
+            ),
+            'insert_data': lambda: self.client.post(
+                reverse('table-insert-data', kwargs={'pk': table_ids[0]}),
+                {field['name']: 'updated' for field in fields}, format='json'
+            ),
+            'partial_update': lambda: self.client.patch(
+                detail, {'name': 'films'}, format='json'
+            ),
+            'update': lambda: self.client.put(
+                detail, {'name': 'films', 'fields': []}, format='json'
+            ),
+            'destroy': lambda: self.client.delete(
+                reverse('table-detail', kwargs={'pk': table_ids[-1]})
+            ),
+        }
+
+    def capture(self, tables, columns):
+        """
+        Returns the queries of every action on a fresh set of tables
+        """
+        Table.objects.all().delete()
+        ShardMap.objects.all().delete()
+        fields, table_ids = self.create_tables(tables, columns)
+        captured = {}
+        for action, request in self.requests(fields, table_ids).items():
+            with CaptureQueriesContext(connection) as context:
+                response = request()
+            self.assertLess(response.status_code, 400, action)
+            captured[action] = context.captured_queries
+        return captured
+
+    def test_query_budgets(self):
+        runs = {size: self.capture(*size) for size in self.SIZES}
+        smallest = runs[self.SIZES[0]]
+        for size, captured in runs.items():
+            for action, queries in captured.items():
+                with self.subTest(action=action, size=size):
+                    self.assertLessEqual(
+                        len(queries), self.BUDGETS[action],
+                        f'{action} ran {len(queries)} queries with {size[0]} '
+                        f'tables of {size[1]} columns, its budget is '
+                        f'{self.BUDGETS[action]}:\n{format_queries(queries)}'
+                    )
+                    expected = [
+                        normalize_sql(query['sql'])
+                        for query in smallest[action]
+                    ]
+                    actual = [normalize_sql(query['sql']) for query in queries]
+                    self.assertEqual(
+                        expected, actual,
+                        f'{action} queries grow with the data:\n' + '\n'.join(
+                            difflib.unified_diff(
+                                expected, actual, lineterm='',
+                                fromfile=f'{self.SIZES[0]} (tables, columns)',
+                                tofile=f'{size} (tables, columns)',
+                            )
+                        )
+                    )
+
+
+class TimingBaselineTests(APITestCase):
+    """
+    # Test key paths stay within a tolerance of their stored baselines
+
+    Refresh the baselines after an intended change by running this class
+    with SCHEMAS_UPDATE_BASELINES=1 set in the environment
+    """
+    BASELINES_PATH = os.path.join(
+        os.path.dirname(__file__), 'perf_baselines.json'
+    )
+    TABLES = 50
+    COLUMNS = 8
+    REPEAT = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(cls.BASELINES_PATH) as stream:
+            cls.baselines = json.load(stream)
+        cls.measured = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.environ.get('SCHEMAS_UPDATE_BASELINES'):
+            cls.baselines['baselines'].update(cls.measured)
+            with open(cls.BASELINES_PATH, 'w') as stream:
+                json.dump(cls.baselines, stream, indent=2, sort_keys=True)
+                stream.write('\n')
+        super().tearDownClass()
+
+    def setUp(self):
+        self.fields = [
+            {'name': f'column_{column}', 'attr_type': 'str'}
+            for column in range(self.COLUMNS)
+        ]
+        self.table_ids = []
+        for row in range(self.TABLES):
+            table = Table.objects.create_table_with_attributes(
+                'movies', self.fields
+            )
+            Table.objects.insert_data(table.pk, {
+                field['name']: f'value {row % 5}' for field in self.fields
+            })
+            self.table_ids.append(table.pk)
+
+    def assertWithinBaseline(self, path, request):
+        """
+        Times the best of REPEAT calls against the stored baseline
+        """
+        best = None
+        for _ in range(self.REPEAT):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = request()
+                elapsed = (time.perf_counter() - started) * 1000
+            self.assertLess(response.status_code, 400, path)
+            best = elapsed if best is None else min(best, elapsed)
+        self.measured[path] = round(best, 2)
+
+        baseline = self.baselines['baselines'].get(path)
+        if os.environ.get('SCHEMAS_UPDATE_BASELINES') or baseline is None:
+            return
+        limit = max(
+            baseline * self.baselines['tolerance'], self.baselines['min_ms']
+        )
+        self.assertLessEqual(
+            best, limit,
+            f'{path} took {best:.2f} ms, its baseline is {baseline:.2f} ms '
+            f'(limit {limit:.2f} ms). Queries of the last call:\n'
+            f'{format_queries(context.captured_queries)}'
+        )
+
+    def test_list(self):
+        self.assertWithinBaseline(
+            'list', lambda: self.client.get(reverse('table-list'))
+        )
+
+    def test_filter(self):
+        self.assertWithinBaseline('filter', lambda: self.client.get(
+            reverse('table-list') + '?column_0=value+1&column_1=value+2'
+        ))
+
+    def test_retrieve(self):
+        url = reverse('table-detail', kwargs={'pk': self.table_ids[0]})
+        self.assertWithinBaseline('retrieve', lambda: self.client.get(url))
+
+    def test_insert_data(self):
+        url = reverse('table-insert-data', kwargs={'pk': self.table_ids[0]})
+        data = {field['name']: 'updated' for field in self.fields}
+        self.assertWithinBaseline(
+            'insert_data', lambda: self.client.post(url, data, format='json')
+        )
+
+    def test_create(self):
+        data = {'name': 'movies', 'fields': self.fields}
+        self.assertWithinBaseline('create', lambda: self.client.post(
+            reverse('table-list'), data, format='json'
+        ))
+
+
+class SlowQueryLogTests(APITestCase):
+    """
+    # Test queries above the threshold are logged with their view action
+    # Test reads are logged with their query plan
+    # Test the log is aggregated by fingerprint
+    # Test nothing is logged below the threshold or when disabled
+    """
+
+    def setUp(self):
+        for title in ('Alien', 'Brazil'):
+            table = Table.objects.create_table_with_attributes('movies', [
+                {'name': 'title', 'attr_type': 'str'},
+            ])
+            Table.objects.insert_data(table.pk, {'title': title})
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            normalize_sql('SELECT a FROM t WHERE b IN (%s, %s) LIMIT 21'),
+            normalize_sql('SELECT a FROM t WHERE b IN (%s) LIMIT 5'),
+        )
+        self.assertNotEqual(
+            fingerprint(normalize_sql('SELECT a FROM t')),
+            fingerprint(normalize_sql('SELECT b FROM t')),
+        )
+
+    @override_settings(SCHEMAS_SLOW_QUERY_LOG={
+        'ENABLED': True, 'QUERY_THRESHOLD_MS': 0
+    })
+    def test_slow_queries_logged(self):
+        self.client.get(reverse('table-list') + '?title=Alien')
+        queries = SlowQuery.objects.all()
+        self.assertTrue(queries)
+        self.assertEqual(
+            {(query.view, query.action) for query in queries},
+            {('table-list', 'list')}
+        )
+        lookup = next(query for query in queries if 'Alien' in query.params)
+        self.assertTrue(lookup.sql.startswith('SELECT'))
+        self.assertIn('schemas_attribute', lookup.plan)
+
+        url = reverse(
+            'table-insert-data', kwargs={'pk': Table.objects.first().pk}
+        )
+        self.client.post(url, {'title': 'Cube'}, format='json')
+        self.assertTrue(SlowQuery.objects.filter(
+            action='insert_data', sql__startswith='UPDATE', plan=''
+        ).exists())
+
+    @override_settings(SCHEMAS_SLOW_QUERY_LOG={
+        'ENABLED': True, 'QUERY_THRESHOLD_MS': 0
+    })
+    def test_top_offenders(self):
+        url = reverse('table-detail', kwargs={'pk': Table.objects.first().pk})
+        self.client.get(url)
+        self.client.get(url)
+        with override_settings(SCHEMAS_SLOW_QUERY_LOG={'ENABLED': False}):
+            response = self.client.get(reverse('slow-queries-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data)
+        self.assertEqual(
+            {offender['count'] for offender in response.data}, {2}
+        )
+        self.assertEqual(
+            len(response.data),
+            SlowQuery.objects.values('fingerprint').distinct().count()
+        )
+        totals = [offender['total_ms'] for offender in response.data]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+
+    def test_fast_queries_not_logged(self):
+        with override_settings(SCHEMAS_SLOW_QUERY_LOG={
+            'ENABLED': True, 'QUERY_THRESHOLD_MS': 60000
+        }):
+            self.client.get(reverse('table-list'))
+        self.client.get(reverse('table-list'))
+        self.assertEqual(SlowQuery.objects.count(), 0)
+
+
+class FieldProjectionTests(APITestCase):
+    """
+    # Test ?fields= limits list and retrieve payloads
+    # Test unrequested attributes are not fetched
+    # Test payloads are unchanged without ?fields= or with an empty one
+    """
+
+    def setUp(self):
+        self.table = Table.objects.create_table_with_attributes('movies', [
+            {'name': 'title', 'attr_type': 'str'},
+            {'name': 'rating', 'attr_type': 'float'},
+            {'name': 'director', 'attr_type': 'str'},
+        ])
+        Table.objects.insert_data(self.table.pk, {
+            'title': 'Alien', 'rating': 8.5, 'director': 'Scott'
+        })
+        self.detail = reverse('table-detail', kwargs={'pk': self.table.pk})
+
+    def test_fields_projection(self):
+        response = self.client.get(
+            reverse('table-list') + '?fields=title,rating&title=Alien'
+        )
+        self.assertEqual(
+            response.data['results'], [{'title': 'Alien', 'rating': 8.5}]
+        )
+        response = self.client.get(self.detail + '?fields=director,name')
+        self.assertEqual(
+            response.data, {'director': 'Scott', 'name': 'movies'}
+        )
+
+    def test_projection_pushed_down(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.detail + '?fields=title')
+        attribute_query = next(
+            query['sql'] for query in context.captured_queries
+            if 'FROM "schemas_attribute"' in query['sql']
+        )
+        self.assertIn(
+            '"schemas_attribute"."name" IN (\'title\')', attribute_query
+        )
+
+    def test_no_fields_unchanged(self):
+        for query in ('', '?fields=', '?fields=,'):
+            response = self.client.get(self.detail + query)
+            self.assertEqual(response.data, {
+                'title': 'Alien', 'rating': 8.5, 'director': 'Scott',
+                'name': 'movies'
+            })
+
+
+@override_settings(ROOT_URLCONF='project.urls_api')
+class ApiProfileTests(APITestCase):
+    """
+    # Test API-only URLconf serves the schema API
+    # Test API-only URLconf drops admin and auth routes
+    """
+
+    def test_api_profile_serves_tables(self):
+        TableFactory.create_batch(2)
+        response = self.client.get(reverse('table-list'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_api_profile_has_no_admin_routes(self):
+        with self.assertRaises(NoReverseMatch):
+            reverse('admin:index')
+        response = self.client.get('/auth/login/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,7 +1,15 @@
 from rest_framework.routers import DefaultRouter
-from .views import TableViewSet
+from .views import (
+    TableViewSet,
+    AdmissionViewSet,
+    ChangeViewSet,
+    SlowQueryViewSet,
+)
 
 router = DefaultRouter()
 router.register('table', TableViewSet, basename="table")
+router.register('admission', AdmissionViewSet, basename="admission")
+router.register('changes', ChangeViewSet, basename="changes")
+router.register('slow-queries', SlowQueryViewSet, basename="slow-queries")
 
 urlpatterns = router.urls
@@ -1,21 +1,61 @@
+from django.http import Http404
 from rest_framework.response import Response
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 
+from .admission import AdmissionControlMixin, get_controller
+from .changes import get_config, is_truncated, wait_for_changes
 from .serializers import (
+    ChangeEventSerializer,
     TableSerializer,
     TableSchemaSerializer,
 )
-from .models import Table
+from .models import Table, ShardMap, ChangeEvent, SlowQuery
 
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
 
-class TableViewSet(viewsets.ModelViewSet):
+
+def parse_flag(value):
+    return value is not None and value.lower() in TRUE_VALUES
+
+
+class TableViewSet(AdmissionControlMixin, viewsets.ModelViewSet):
     """
     This viewset represents the CRUD and extra actions for SQL Simulation
     """
     queryset = Table.objects.all()
     serializer_class = TableSchemaSerializer
     authentication_classes = []
+    # Query params that are not attribute filters
+    reserved_query_params = ('explain', 'fields', 'limit', 'offset')
+
+    def get_queryset(self):
+        """
+        Detail routes read from the shard owning the table, the rest from
+        every shard
+        """
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if pk is None:
+            return Table.objects.all_shards()
+        try:
+            return Table.objects.on_shard_of(pk).all()
+        except ValueError:
+            raise Http404
+
+    def get_serializer_context(self):
+        """
+        ?fields=title,rating renders only those attributes, an empty
+        ?fields= renders every attribute
+        """
+        context = super().get_serializer_context()
+        fields = [
+            name.strip()
+            for name in self.request.query_params.get('fields', '').split(',')
+            if name.strip()
+        ]
+        if fields:
+            context['fields'] = fields
+        return context
 
     def create(self, request, *args, **kwargs):
         """
@@ -38,23 +78,50 @@ class TableViewSet(viewsets.ModelViewSet):
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def perform_destroy(self, instance):
+        table_id = instance.pk
+        instance.delete()
+        ShardMap.objects.filter(table_id=table_id).delete()
+        ChangeEvent.objects.record(ChangeEvent.TABLE_DROP, table_id)
+
     def list(self, request, *args, **kwargs):
         """
-        List and filter tables, queryparams are allowed
+        List and filter tables, queryparams are allowed.
+        ?explain=1 returns the filter plan instead of the tables
         """
-        query_params = request.query_params
+        query_params = {
+            key: value for key, value in request.query_params.items()
+            if key not in self.reserved_query_params
+        }
+
+        shards = Table.objects.shards()
+        if parse_flag(request.query_params.get('explain')):
+            plans = [
+                shard.plan_filter(query_params).as_dict() for shard in shards
+            ]
+            if len(plans) == 1:
+                return Response({'plan': plans[0]})
+            return Response({'plans': plans})
 
         if query_params:
-            queryset = Table.objects.filter_by_attr(query_params)
+            queryset = []
+            for shard in shards:
+                queryset.extend(shard.filter_by_attr(query_params))
+            # Same order as unfiltered lists, whatever shard matched
+            queryset.sort(key=Table.objects.ordering_key)
         else:
             queryset = self.get_queryset()
 
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = TableSerializer(page, many=True)
+            serializer = TableSerializer(
+                page, many=True, context=self.get_serializer_context()
+            )
             return self.get_paginated_response(serializer.data)
 
-        serializer = TableSerializer(queryset, many=True)
+        serializer = TableSerializer(
+            queryset, many=True, context=self.get_serializer_context()
+        )
         return Response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
@@ -62,7 +129,9 @@ class TableViewSet(viewsets.ModelViewSet):
         Retrieves one table by id
         """
         instance = self.get_object()
-        serializer = TableSerializer(instance)
+        serializer = TableSerializer(
+            instance, context=self.get_serializer_context()
+        )
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
@@ -70,11 +139,8 @@ class TableViewSet(viewsets.ModelViewSet):
         """
         Retrieves table's schema by id
         """
-        try:
-            table = Table.objects.get(pk=1)
-            serializer = TableSchemaSerializer(table)
-        except Table.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+        table = self.get_object()
+        serializer = TableSchemaSerializer(table)
         return Response(data=serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
@@ -82,11 +148,88 @@ class TableViewSet(viewsets.ModelViewSet):
         """
         Inserts data into the attributes of an existing table
         """
+        table = self.get_object()
         try:
-            table = Table.objects.get(pk=int(pk))
-            Table.objects.insert_data(table.pk, request.data)
-        except Table.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+            Table.objects.db_manager(table._state.db).insert_data(
+                table.pk, request.data
+            )
         except ValueError as e:
             return Response(data=e.args[0], status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_200_OK)
+
+
+class AdmissionViewSet(viewsets.ViewSet):
+    """
+    Exposes the admission control queues and shed counters
+    """
+    authentication_classes = []
+
+    def list(self, request):
+        return Response(get_controller().metrics())
+
+
+class ChangeViewSet(AdmissionControlMixin, viewsets.ViewSet):
+    """
+    Change feed of the tables, long-polls for events after ?since=<seq>
+    """
+    authentication_classes = []
+    admission_endpoints = {'list': 'changes'}
+
+    def list(self, request):
+        config = get_config()
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(
+                int(request.query_params.get('limit', config['BATCH_SIZE'])),
+                config['BATCH_SIZE']
+            )
+            timeout = min(
+                float(request.query_params.get(
+                    'timeout', config['LONG_POLL_TIMEOUT']
+                )),
+                config['LONG_POLL_TIMEOUT']
+            )
+        except ValueError:
+            return Response(
+                data='since, limit and timeout must be numbers',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if is_truncated(since):
+            return Response(
+                data={
+                    'detail': 'Changes after since were deleted, reload the '
+                              'tables',
+                    'head': ChangeEvent.objects.head(),
+                },
+                status=status.HTTP_410_GONE
+            )
+
+        events, more = wait_for_changes(
+            since, max(limit, 1), max(timeout, 0), config['POLL_INTERVAL']
+        )
+        return Response({
+            'since': since,
+            'next': events[-1].seq if events else since,
+            'head': ChangeEvent.objects.head(),
+            'more': more,
+            'results': ChangeEventSerializer(events, many=True).data,
+        })
+
+
+class SlowQueryViewSet(viewsets.ViewSet):
+    """
+    Top slow queries by fingerprint, most total time first
+    """
+    authentication_classes = []
+    default_limit = 20
+
+    def list(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return Response(
+                data='limit must be a number',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(SlowQuery.objects.top_offenders(max(limit, 1)))